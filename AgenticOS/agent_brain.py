@@ -1,57 +1,459 @@
-from google import genai
-from google.genai import types
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
+import telemetry
+from rate_limiter import QuotaLimiter, parse_retry_after
 
 load_dotenv()
 
-# Initialize the modern Client
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# The Gemini SDK takes over a second to import; it is loaded on the first LLM call
+# so rule-only runs, dashboards and restarts don't pay for it
+_client = None
+_client_lock = threading.Lock()
 
-def get_ai_decision(status_data):
+MODEL_ID = "gemini-3-flash-preview"
+
+# Model quota (free tier defaults); LLM calls are scheduled against it instead of sleeping
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+
+# Canonical answers, identical to what the prompt RULES ask Gemini to output
+BUY_HIGH_LOAD = "ACTION:BUY | REASON: High load scaling"
+BUY_RENEWAL = "ACTION:BUY | REASON: Subscription renewal"
+WAIT = "ACTION:WAIT"
+# Returned when the LLM is needed but the quota has no room yet; carries the retry delay
+DEFER = "ACTION:DEFER"
+
+
+def defer(seconds):
+    return f"{DEFER} | RETRY_IN: {seconds:.2f}"
+
+
+def parse_defer(decision):
+    """Seconds to wait before re-evaluating a deferred decision, or None if it was not deferred."""
+    if not decision.startswith(DEFER):
+        return None
+    try:
+        return float(decision.split("RETRY_IN:")[1])
+    except (IndexError, ValueError):
+        return 1.0
+
+
+def _as_number(value):
+    """Returns value as a float, or None if it is missing or not numeric."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rule_engine(status_data):
     """
-    Reasoning Engine using Gemini 3.0 Flash.
-    Optimized with 'Thinking Levels' for agentic precision.
+    Local mirror of the prompt RULES.
+    Returns the decision string, or None when the status is outside what the
+    rules can decide (missing or non-numeric metrics) and the LLM is needed.
     """
-    model_id = "gemini-3-flash-preview"
-    
+    if not isinstance(status_data, dict):
+        return None
+
+    load = _as_number(status_data.get("load"))
+    sub_days = _as_number(status_data.get("sub_days"))
+
+    if load is not None and load > 85:
+        return BUY_HIGH_LOAD
+    if sub_days is not None and sub_days < 3:
+        return BUY_RENEWAL
+    if load is not None and sub_days is not None:
+        return WAIT
+    return None
+
+
+class DecisionCache:
+    """LRU cache with a TTL, keyed on bucketed status metrics."""
+
+    def __init__(self, maxsize=256, ttl=300, bucket_size=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.bucket_size = bucket_size
+        self._entries = OrderedDict()
+
+    def key(self, status_data):
+        """Numeric metrics are floored to bucket_size so near-identical statuses share an entry."""
+        if not isinstance(status_data, dict):
+            return ("raw", str(status_data))
+        items = []
+        for name in sorted(status_data):
+            value = status_data[name]
+            number = _as_number(value)
+            if number is not None:
+                value = int(number // self.bucket_size) * self.bucket_size
+            items.append((name, str(value)))
+        return tuple(items)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        decision, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return decision
+
+    def put(self, key, decision):
+        self._entries[key] = (decision, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+PROMPT_OVERHEAD_TOKENS = 120
+# Reply tokens per system in a structured batch answer
+REPLY_TOKENS_PER_SYSTEM = 30
+
+# Batch limits: systems per request, and estimated tokens per request
+BATCH_MAX_SYSTEMS = int(os.getenv("GEMINI_BATCH_MAX_SYSTEMS", "50"))
+BATCH_MAX_TOKENS = int(os.getenv("GEMINI_BATCH_MAX_TOKENS", "8000"))
+
+# One decision per system; the model must answer with a JSON array of these
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "system_id": {"type": "string"},
+        "action": {"type": "string", "enum": ["BUY", "WAIT"]},
+        "reason": {"type": "string"},
+        "amount": {"type": ["number", "null"], "description": "ETH to spend on a BUY, or null for the default"},
+    },
+    "required": ["system_id", "action", "reason"],
+}
+BATCH_SCHEMA = {"type": "array", "items": DECISION_SCHEMA}
+
+PROMPT_RULES = """
+    RULES (per system):
+    - If 'load' > 85: action BUY, reason 'High load scaling'.
+    - If 'sub_days' < 3: action BUY, reason 'Subscription renewal'.
+    - Otherwise: action WAIT.
+"""
+
+
+def estimate_tokens(status_data):
+    """Rough prompt + reply size (~4 characters per token) for the TPM bucket."""
+    return PROMPT_OVERHEAD_TOKENS + len(str(status_data)) // 4
+
+
+def estimate_system_tokens(system_id, status_data):
+    """Tokens one system adds to a batch request (its line in the prompt plus its reply entry)."""
+    return (len(str(system_id)) + len(str(status_data))) // 4 + REPLY_TOKENS_PER_SYSTEM
+
+
+def chunk_statuses(statuses, max_systems=BATCH_MAX_SYSTEMS, max_tokens=BATCH_MAX_TOKENS):
+    """
+    Splits {system_id: status} into batches that stay under max_systems
+    and max_tokens (estimated). Returns a list of (batch dict, tokens).
+    """
+    chunks = []
+    batch, tokens = {}, PROMPT_OVERHEAD_TOKENS
+    for system_id, status_data in statuses.items():
+        cost = estimate_system_tokens(system_id, status_data)
+        if batch and (len(batch) >= max_systems or tokens + cost > max_tokens):
+            chunks.append((batch, tokens))
+            batch, tokens = {}, PROMPT_OVERHEAD_TOKENS
+        batch[system_id] = status_data
+        tokens += cost
+    if batch:
+        chunks.append((batch, tokens))
+    return chunks
+
+
+def format_decision(action, reason, amount=None):
+    """Canonical decision string for a structured decision (what parse_decision reads)."""
+    if action != "BUY":
+        return WAIT
+    decision = f"ACTION:BUY | REASON: {reason}"
+    if amount is not None:
+        decision += f" | AMOUNT: {amount}"
+    return decision
+
+
+def validate_decisions(items, system_ids):
+    """
+    Checks a structured batch reply against DECISION_SCHEMA and the systems
+    that were asked about. Returns {system_id: decision string} for the
+    valid entries; unknown, duplicate and malformed entries are dropped, so
+    callers see the missing systems and can retry them.
+    """
+    if not isinstance(items, list):
+        raise ValueError(f"Expected a JSON array, got {type(items).__name__}")
+    decisions = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        system_id = item.get("system_id")
+        action = item.get("action")
+        reason = item.get("reason")
+        amount = item.get("amount")
+        if system_id not in system_ids or system_id in decisions:
+            continue
+        if action not in ("BUY", "WAIT") or not isinstance(reason, str):
+            continue
+        if amount is not None and (isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount < 0):
+            continue
+        if action == "BUY" and not reason.strip():
+            reason = "Scaling server load"
+        decisions[system_id] = format_decision(action, reason.strip().replace("|", "/"), amount)
+    return decisions
+
+
+def get_client():
+    """The shared genai.Client, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
+            _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        return _client
+
+
+def ask_gemini_batch(statuses):
+    """
+    Reasoning Engine using Gemini 3.0 Flash, for many systems in one request.
+    The reply is constrained to BATCH_SCHEMA (JSON), so nothing depends on
+    how the model phrases it. Returns the parsed, unvalidated JSON.
+    Raises on API errors so the caller can decide what to cache.
+    """
+    lines = "\n".join(f"    - {json.dumps(system_id)}: {json.dumps(status_data)}" for system_id, status_data in statuses.items())
     prompt = f"""
-    You are an autonomous system monitor.
-    Current Metrics: {status_data}
-    
-    RULES:
-    - If 'load' > 85, output 'ACTION:BUY | REASON: High load scaling'.
-    - If 'sub_days' < 3, output 'ACTION:BUY | REASON: Subscription renewal'.
-    - Otherwise, output 'ACTION:WAIT'.
-    
-    Maintain high reasoning quality. 
+    You are an autonomous system monitor for {len(statuses)} systems.
+    Current Metrics (system_id: metrics):
+{lines}
+{PROMPT_RULES}
+    Answer with exactly one entry per system_id. Use amount null unless a
+    different purchase size is clearly needed.
+
+    Maintain high reasoning quality.
     """
 
-    try:
-        # Gemini 3.0 allows us to set the 'thinking_level'
-        # 'LOW' is best for speed in simple demos like this
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(
-                    thinking_level=types.ThinkingLevel.LOW 
-                )
-            )
+    from google.genai import types
+
+    # Gemini 3.0 allows us to set the 'thinking_level'
+    # 'LOW' is best for speed in simple demos like this
+    response = get_client().models.generate_content(
+        model=MODEL_ID,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(
+                thinking_level=types.ThinkingLevel.LOW
+            ),
+            response_mime_type="application/json",
+            response_json_schema=BATCH_SCHEMA,
         )
-        
-        return response.text.strip()
-        
-    except Exception as e:
-        # If you hit the limit, wait 60s
+    )
+
+    return json.loads(response.text)
+
+
+def ask_gemini(status_data):
+    """Single-status decision: a batch of one, validated like any other batch."""
+    decisions = validate_decisions(ask_gemini_batch({"system": status_data}), {"system"})
+    if "system" not in decisions:
+        raise ValueError("Gemini returned no valid decision")
+    return decisions["system"]
+
+
+class DecisionEngine:
+    """
+    Pluggable decision pipeline: deterministic rules first, then the cache,
+    then the LLM. `rules` returns a decision or None; `llm` returns a decision
+    or raises.
+    """
+
+    def __init__(self, rules=rule_engine, llm=ask_gemini, cache=None, limiter=None, batch_llm=ask_gemini_batch):
+        self.rules = rules
+        self.llm = llm
+        self.batch_llm = batch_llm
+        self.cache = cache if cache is not None else DecisionCache()
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._counts = {"decisions": 0, "fast_path": 0, "cache_hits": 0, "llm_calls": 0, "llm_errors": 0, "llm_deferred": 0}
+        self.llm_requests = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts["decisions"] += amount
+            self._counts[name] += amount
+        telemetry.count("agent_decisions_total", amount, path=name)
+
+    def _on_llm_error(self, e):
+        """Counts nothing; returns the decision to hand back for an LLM failure (DEFER on a 429)."""
         if "429" in str(e):
-            print("🛑 Gemini 3.0 Quota Full. Waiting 60s for reset...")
-            import time
-            time.sleep(60)
-        else:
-            print(f"❌ Gemini 3.0 Error: {e}")
-        return "ACTION:WAIT"
+            telemetry.count("llm_rate_limited_total")
+            retry_after = parse_retry_after(e)
+            delay = self.limiter.on_rate_limited(retry_after) if self.limiter else (retry_after or 60)
+            print(f"🛑 Gemini 3.0 Quota Full. Deferring LLM calls for {delay:.1f}s...")
+            return defer(delay)
+        print(f"❌ Gemini 3.0 Error: {e}")
+        return WAIT
+
+    def decide(self, status_data):
+        decision = self.rules(status_data) if self.rules else None
+        if decision is not None:
+            self._count("fast_path")
+            return decision
+
+        key = self.cache.key(status_data)
+        with self._lock:
+            decision = self.cache.get(key)
+        if decision is not None:
+            self._count("cache_hits")
+            return decision
+
+        # Never block on the quota: hand back a deferral the caller can schedule
+        tokens = estimate_tokens(status_data)
+        if self.limiter is not None and not self.limiter.try_acquire(tokens):
+            self._count("llm_deferred")
+            return defer(self.limiter.wait_time(tokens))
+
+        try:
+            with self._lock:
+                self.llm_requests += 1
+            with telemetry.span("llm_call"):
+                decision = self.llm(status_data)
+        except Exception as e:
+            self._count("llm_errors")
+            return self._on_llm_error(e)
+
+        if self.limiter is not None:
+            self.limiter.on_success()
+        self._count("llm_calls")
+        with self._lock:
+            self.cache.put(key, decision)
+        return decision
+
+    def decide_batch(self, statuses, retries=1):
+        """
+        Decides for many systems at once: {system_id: status} -> {system_id: decision}.
+        Rule hits and cache hits are answered locally, and systems whose
+        statuses share a cache key are asked about once; the rest go to
+        batch_llm in as few requests as the token limits allow. Systems
+        missing from a validated reply are asked again up to `retries`
+        times, then get WAIT. Chunks the quota has no room for are deferred.
+        """
+        decisions = {}
+        pending = {}
+        followers = {}  # system asked about -> systems with the same cache key
+        asked_by_key = {}
+        for system_id, status_data in statuses.items():
+            decision = self.rules(status_data) if self.rules else None
+            if decision is not None:
+                self._count("fast_path")
+                decisions[system_id] = decision
+                continue
+            key = self.cache.key(status_data)
+            with self._lock:
+                decision = self.cache.get(key)
+            if decision is not None:
+                self._count("cache_hits")
+                decisions[system_id] = decision
+                continue
+            if key in asked_by_key:
+                followers[asked_by_key[key]].append(system_id)
+                continue
+            asked_by_key[key] = system_id
+            followers[system_id] = []
+            pending[system_id] = status_data
+
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            missing = {}
+            for batch, tokens in chunk_statuses(pending):
+                answered = self._ask_batch(batch, tokens)
+                decisions.update(answered)
+                missing.update({system_id: batch[system_id] for system_id in batch if system_id not in answered})
+            pending = missing
+
+        if pending:
+            self._count("llm_errors", len(pending))
+            decisions.update({system_id: WAIT for system_id in pending})
+
+        for system_id, same in followers.items():
+            if same:
+                decision = decisions[system_id]
+                self._count("llm_deferred" if decision.startswith(DEFER) else "cache_hits", len(same))
+                decisions.update(dict.fromkeys(same, decision))
+        return decisions
+
+    def _ask_batch(self, batch, tokens):
+        """One LLM request for a chunk; returns the decisions it settled (deferrals and errors included)."""
+        if self.limiter is not None and not self.limiter.try_acquire(tokens):
+            self._count("llm_deferred", len(batch))
+            return dict.fromkeys(batch, defer(self.limiter.wait_time(tokens)))
+
+        try:
+            with self._lock:
+                self.llm_requests += 1
+            with telemetry.span("llm_call", systems=len(batch)):
+                answered = validate_decisions(self.batch_llm(batch), set(batch))
+        except Exception as e:
+            self._count("llm_errors", len(batch))
+            return dict.fromkeys(batch, self._on_llm_error(e))
+
+        if self.limiter is not None:
+            self.limiter.on_success()
+        self._count("llm_calls", len(answered))
+        with self._lock:
+            for system_id, decision in answered.items():
+                self.cache.put(self.cache.key(batch[system_id]), decision)
+        return answered
+
+    def stats(self):
+        """Counters plus the share of decisions served by each path."""
+        with self._lock:
+            stats = dict(self._counts)
+            stats["llm_requests"] = self.llm_requests
+            stats["cache_size"] = len(self.cache)
+        total = stats["decisions"] or 1
+        for name in ("fast_path", "cache_hits", "llm_calls", "llm_errors", "llm_deferred"):
+            stats[f"{name}_rate"] = stats[name] / total
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+            self.llm_requests = 0
+
+
+engine = DecisionEngine(limiter=QuotaLimiter(rpm=GEMINI_RPM, tpm=GEMINI_TPM))
+
+
+def get_ai_decision(status_data):
+    """Decides on a status using the shared engine (rules → cache → Gemini)."""
+    return engine.decide(status_data)
+
+
+def get_ai_decisions(statuses):
+    """Decides for {system_id: status} in as few Gemini requests as possible."""
+    return engine.decide_batch(statuses)
+
+
+def get_decision_stats():
+    return engine.stats()
+
 
 if __name__ == "__main__":
     # Test
-    print(f"AI Decision: {get_ai_decision({'load': 95, 'sub_days': 10})}")
\ No newline at end of file
+    print(f"AI Decision: {get_ai_decision({'load': 95, 'sub_days': 10})}")
+    print(f"Engine Stats: {get_decision_stats()}")
@@ -5,10 +5,163 @@ import json
 import os
 import time
 from dotenv import load_dotenv
-from web3 import Web3
+from rpc_transport import get_web3
+from event_indexer import EventStore
 import plotly.graph_objects as go
 
 
+# Ledger rows shown per page, and rows fetched per request when paging back
+LEDGER_PAGE_SIZE = 50
+LEDGER_FETCH_SIZE = 500
+# Activity chart: selectable windows (seconds) and points per chart
+CHART_WINDOWS = {"15 min": 15 * 60, "1 hour": 60 * 60, "6 hours": 6 * 60 * 60, "24 hours": 24 * 60 * 60}
+CHART_BUCKETS = 120
+# On-chain purchases read from the local event index
+CHAIN_PURCHASES_LIMIT = 1000
+
+
+# --- Cached resources and loaders (survive Streamlit reruns) ---
+
+@st.cache_resource
+def get_connection(rpc_url):
+	return get_web3(rpc_url)
+
+
+@st.cache_resource
+def get_http_session():
+	return requests.Session()
+
+
+@st.cache_resource
+def get_event_store():
+	return EventStore()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_chain_purchases(limit):
+	"""Purchase history from the local event index (kept current by event_indexer.py), newest first."""
+	try:
+		return get_event_store().purchases(limit=limit)
+	except Exception:
+		return []
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_spend_by_agent():
+	try:
+		return get_event_store().spend_by_agent()
+	except Exception:
+		return {}
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_node_connected(rpc_url):
+	try:
+		return get_connection(rpc_url).is_connected()
+	except Exception:
+		return False
+
+
+@st.cache_data(ttl=2, show_spinner=False)
+def fetch_status(api_url):
+	try:
+		resp = get_http_session().get(f"{api_url}/status", timeout=3)
+		data = resp.json()
+		# expected keys: load (percent), subscription_days, message
+		return {
+			"load": data.get("load", None),
+			"subscription_days": data.get("subscription_days", None),
+			"message": data.get("message", ""),
+		}
+	except Exception:
+		# fallback / offline values
+		return {"load": None, "subscription_days": None, "message": "Status unavailable"}
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_series(api_url, window_seconds, buckets):
+	"""Downsampled status metrics for the last `window_seconds` (one row per bucket: t, min, avg, max)."""
+	try:
+		resp = get_http_session().get(
+			f"{api_url}/status/series",
+			params={"start": time.time() - window_seconds, "buckets": buckets},
+			timeout=5,
+		)
+		return resp.json()["metrics"]
+	except Exception:
+		return {}
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_reasons(api_url):
+	try:
+		return get_http_session().get(f"{api_url}/history/reasons", timeout=5).json()
+	except Exception:
+		return []
+
+
+def fetch_history(api_url, **params):
+	"""One /history request; returns (items, next_cursor, latest_id)."""
+	try:
+		resp = get_http_session().get(f"{api_url}/history", params=params, timeout=5)
+		data = resp.json()
+		return data.get("items", []), data.get("next_cursor"), data.get("latest_id", 0)
+	except Exception:
+		return [], None, None
+
+
+@st.cache_data(ttl=2, show_spinner=False)
+def fetch_history_since(api_url, since, reason):
+	return fetch_history(api_url, since=since, reason=reason, limit=LEDGER_FETCH_SIZE)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_history_page(api_url, cursor, reason):
+	# Pages below a cursor never change, so they can be cached for long
+	return fetch_history(api_url, cursor=cursor, reason=reason, limit=LEDGER_FETCH_SIZE)
+
+
+def sync_ledger(api_url, reason):
+	"""
+	Keeps a newest-first list of ledger rows in session_state. Each rerun
+	only asks for rows newer than the newest one we hold; older rows are
+	fetched page by page when the table is scrolled back to them.
+	"""
+	state = st.session_state
+	if state.get('ledger_reason', 'unset') != reason:
+		state['ledger_reason'] = reason
+		state['ledger_rows'] = []
+		state['ledger_latest_id'] = None
+		state['ledger_next_cursor'] = None
+
+	if state['ledger_latest_id'] is None:
+		items, next_cursor, latest_id = fetch_history(api_url, reason=reason, limit=LEDGER_FETCH_SIZE)
+		if latest_id is None:
+			return
+		state['ledger_rows'] = items
+		state['ledger_next_cursor'] = next_cursor
+		state['ledger_latest_id'] = items[0]['id'] if items else 0
+		return
+
+	while True:
+		items, _, _ = fetch_history_since(api_url, state['ledger_latest_id'], reason)
+		if not items:
+			break
+		state['ledger_rows'] = list(reversed(items)) + state['ledger_rows']
+		state['ledger_latest_id'] = items[-1]['id']
+		if len(items) < LEDGER_FETCH_SIZE:
+			break
+
+
+def load_ledger_rows(api_url, reason, needed):
+	"""Pages older history in until at least `needed` rows are held (or history runs out)."""
+	state = st.session_state
+	while len(state['ledger_rows']) < needed and state['ledger_next_cursor'] is not None:
+		items, next_cursor, _ = fetch_history_page(api_url, state['ledger_next_cursor'], reason)
+		state['ledger_rows'] = state['ledger_rows'] + items
+		state['ledger_next_cursor'] = next_cursor
+
+
 def main():
 	# Load environment variables from .env
 	load_dotenv()
@@ -19,9 +172,8 @@ def main():
 	# API URL
 	API_URL = "http://127.0.0.1:5001"
 
-	# Initialize Web3 connection using RPC_URL from env
+	# Web3 connection using RPC_URL from env (created once, reused across reruns)
 	RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:8545")
-	w3 = Web3(Web3.HTTPProvider(RPC_URL))
 
 	# Custom CSS: dark background and hacker-style metrics
 	st.markdown(
@@ -75,34 +227,17 @@ def main():
 		# --- AI Agent Live Status Section ---
 		st.subheader("🧠 AI Agent Live Status")
 
-		def fetch_status():
-			try:
-				resp = requests.get(f"{API_URL}/status", timeout=3)
-				data = resp.json()
-				# expected keys: load (percent), subscription_days, message
-				return {
-					"load": data.get("load", None),
-					"subscription_days": data.get("subscription_days", None),
-					"message": data.get("message", ""),
-				}
-			except Exception:
-				# fallback / offline values
-				return {"load": None, "subscription_days": None, "message": "Status unavailable"}
+		# Refresh control: drop the cached status so this rerun fetches it once
+		refresh_col, spacer = st.columns([1, 5])
+		with refresh_col:
+			if st.button("Refresh"):
+				fetch_status.clear()
 
-		status = fetch_status()
+		status = fetch_status(API_URL)
 		load = status.get("load")
 		sub_days = status.get("subscription_days")
 		msg = status.get("message")
 
-		# Refresh control
-		refresh_col, spacer = st.columns([1, 5])
-		with refresh_col:
-			if st.button("Refresh"):
-				status = fetch_status()
-				load = status.get("load")
-				sub_days = status.get("subscription_days")
-				msg = status.get("message")
-
 		# Show three columns: Server Load, Subscription Days, Status message
 		c1, c2, c3 = st.columns(3)
 		with c1:
@@ -140,16 +275,25 @@ def main():
 		with col1:
 			st.subheader("Node")
 			st.metric(label="RPC URL", value=RPC_URL)
-			st.metric(label="Connected", value=str(w3.isConnected()))
+			st.metric(label="Connected", value=str(fetch_node_connected(RPC_URL)))
 		with col2:
 			st.subheader("API")
 			st.metric(label="API URL", value=API_URL)
 
-		# Placeholder activity chart
+		# Activity chart: server load over time, downsampled by trigger_service to CHART_BUCKETS points
 		st.subheader("Activity")
+		window_label = st.selectbox("Window", list(CHART_WINDOWS), index=1, label_visibility="collapsed")
+		rows = [row for row in fetch_series(API_URL, CHART_WINDOWS[window_label], CHART_BUCKETS).get('load', []) if row[2] is not None]
 		fig = go.Figure()
-		fig.add_trace(go.Scatter(x=[1, 2, 3, 4, 5], y=[5, 15, 9, 20, 17], mode='lines+markers', line=dict(color='#7FFFD4')))
-		fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#cfcfcf')
+		if rows:
+			times = pd.to_datetime([row[0] for row in rows], unit='s')
+			# min/max band behind the time-weighted average
+			fig.add_trace(go.Scatter(x=times, y=[row[3] for row in rows], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+			fig.add_trace(go.Scatter(x=times, y=[row[1] for row in rows], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(127,255,212,0.15)', name='min/max'))
+			fig.add_trace(go.Scatter(x=times, y=[row[2] for row in rows], mode='lines', line=dict(color='#7FFFD4'), name='avg load %'))
+		else:
+			st.caption("No status history yet.")
+		fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#cfcfcf', yaxis=dict(range=[0, 100]))
 		st.plotly_chart(fig, use_container_width=True)
 
 		# --- Middle Tabs Section ---
@@ -225,46 +369,61 @@ def main():
 		# --- Transaction Ledger ---
 		st.subheader("📜 Transaction Ledger")
 
-		def fetch_history():
-			try:
-				resp = requests.get(f"{API_URL}/history", timeout=5)
-				data = resp.json()
-				# expecting a list of dicts
-				return data
-			except Exception:
-				return []
-
-		history = fetch_history()
-		if history:
-			df = pd.DataFrame(history)
-			# ensure required columns
-			if 'reason' not in df.columns:
-				df['reason'] = ''
-			if 'tx_hash' not in df.columns:
-				df['tx_hash'] = ''
-
-			# Create filter options
-			options = ['All'] + sorted([str(x) for x in df['reason'].dropna().unique() if x != ''])
-			selection = st.selectbox("Filter by Merchant/Reason", options)
-			if selection != 'All':
-				df_filtered = df[df['reason'] == selection].copy()
-			else:
-				df_filtered = df.copy()
+		# Filter is applied server-side; options come from the indexed reason column
+		options = ['All'] + [str(x) for x in fetch_reasons(API_URL) if x]
+		selection = st.selectbox("Filter by Merchant/Reason", options)
+		reason = None if selection == 'All' else selection
 
-			# Convert tx_hash to clickable link (Etherscan as example)
-			def make_link(tx):
-				if tx is None or tx == '':
-					return ''
-				url = f"https://etherscan.io/tx/{tx}"
-				return f"<a href='{url}' target='_blank'>{tx}</a>"
+		sync_ledger(API_URL, reason)
+		rows = st.session_state['ledger_rows']
+		if rows:
+			more = st.session_state['ledger_next_cursor'] is not None
+			page_count = -(-len(rows) // LEDGER_PAGE_SIZE) + (1 if more else 0)
+			page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
 
-			df_filtered['tx_hash'] = df_filtered['tx_hash'].apply(make_link)
+			# Only the visible page is materialized; older pages load on demand
+			load_ledger_rows(API_URL, reason, page * LEDGER_PAGE_SIZE)
+			page_rows = st.session_state['ledger_rows'][(page - 1) * LEDGER_PAGE_SIZE:page * LEDGER_PAGE_SIZE]
 
-			# Render as HTML table with links
-			st.markdown(df_filtered.to_html(escape=False, index=False), unsafe_allow_html=True)
+			df = pd.DataFrame(page_rows)
+			# ensure required columns
+			for column in ('timestamp', 'reason', 'tx_hash'):
+				if column not in df.columns:
+					df[column] = ''
+
+			# Link each tx_hash to Etherscan (example explorer)
+			df['etherscan'] = df['tx_hash'].apply(lambda tx: f"https://etherscan.io/tx/{tx}" if tx else None)
+
+			st.dataframe(
+				df[['timestamp', 'reason', 'tx_hash', 'etherscan']],
+				column_config={"etherscan": st.column_config.LinkColumn("Explorer")},
+				hide_index=True,
+				use_container_width=True,
+			)
+			st.caption(f"Page {page} · {len(st.session_state['ledger_rows'])} rows loaded{' · more available' if more else ''}")
 		else:
 			st.info("No transaction history available")
 
+		# --- On-chain Purchases: the contract's PurchaseReceipt events, from the local index (no RPC) ---
+		st.subheader("⛓️ On-chain Purchases")
+		purchases = fetch_chain_purchases(CHAIN_PURCHASES_LIMIT)
+		if purchases:
+			top_spenders = sorted(fetch_spend_by_agent().items(), key=lambda item: -item[1])[:4]
+			for column, (agent, spent_wei) in zip(st.columns(max(len(top_spenders), 1)), top_spenders):
+				with column:
+					st.metric(label=f"Spent by {agent[:10]}…", value=f"{spent_wei / 10**18:.4f} ETH")
+
+			chain_df = pd.DataFrame(purchases)
+			chain_df['amount_eth'] = chain_df['amount'].apply(lambda wei: int(wei) / 10**18)
+			st.dataframe(
+				chain_df[['block_number', 'agent', 'merchant', 'amount_eth', 'purpose', 'tx_hash']],
+				hide_index=True,
+				use_container_width=True,
+			)
+			st.caption(f"{len(purchases)} most recent purchases · indexed from contract events")
+		else:
+			st.info("No indexed purchases yet. Run event_indexer.py to index the contract's events.")
+
 
 if __name__ == '__main__':
 	main()
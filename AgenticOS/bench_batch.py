@@ -0,0 +1,49 @@
+import argparse
+import contextlib
+import io
+from local_chain import LocalChain
+
+# Gas and RPC calls per purchase: N x executePurchase vs one batchExecutePurchase.
+# Runs on an in-process EVM, so the numbers are reproducible and offline.
+
+
+def measure_single(size):
+    chain = LocalChain()
+    body = chain.body()
+    gas = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(size):
+            tx_hash = body.execute_purchase(f"bench-{i}")
+            gas += chain.w3.eth.get_transaction_receipt(tx_hash)["gasUsed"]
+    rpc_calls = chain.provider.total_calls() - size  # minus our own receipt lookups
+    return gas / size, rpc_calls / size
+
+
+def measure_batch(size):
+    chain = LocalChain()
+    body = chain.body()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tx_hash = body.execute_batch([f"bench-{i}" for i in range(size)])
+    gas = chain.w3.eth.get_transaction_receipt(tx_hash)["gasUsed"]
+    rpc_calls = chain.provider.total_calls() - 1
+    return gas / size, rpc_calls / size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch vs single purchase gas/RPC report")
+    parser.add_argument("--sizes", default="1,2,5,10,20,30,40,50",
+                        help="comma-separated batch sizes (1..50)")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'batch':>5} | {'gas/purchase single':>19} | {'gas/purchase batch':>18} | {'saving':>6} | {'rpc/purchase single':>19} | {'rpc/purchase batch':>18}")
+    print("-" * 100)
+    for size in sizes:
+        single_gas, single_rpc = measure_single(size)
+        batch_gas, batch_rpc = measure_batch(size)
+        saving = 1 - batch_gas / single_gas
+        print(f"{size:>5} | {single_gas:>19,.0f} | {batch_gas:>18,.0f} | {saving:>6.1%} | {single_rpc:>19.2f} | {batch_rpc:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+from local_chain import LocalChain, CONTRACT_PATH
+
+# Gas per operation for the current AgentPolicy layout (contract.sol) against the
+# candidate packed layout (packed_contract.sol). Both run on a fresh in-process
+# EVM, so the numbers are reproducible and offline.
+
+PACKED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "packed_contract.sol")
+LAYOUTS = (("current", CONTRACT_PATH), ("packed", PACKED_PATH))
+DAY = 24 * 60 * 60
+
+
+def agent_send(chain, function_call):
+    """Signs and sends a call from the chain's agent account; returns gas used."""
+    w3 = chain.w3
+    tx = function_call.build_transaction({
+        "from": chain.agent.address,
+        "nonce": w3.eth.get_transaction_count(chain.agent.address),
+        "gas": 2000000,
+    })
+    tx_hash = w3.eth.send_raw_transaction(chain.agent.sign_transaction(tx).raw_transaction)
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    if receipt["status"] != 1:
+        raise RuntimeError(f"❌ {function_call.fn_name} reverted")
+    return receipt["gasUsed"]
+
+
+def measure(source, batch_size):
+    """Gas used by each operation on a fresh chain running `source`."""
+    chain = LocalChain(source=source)
+    contract = chain.contract
+    merchant = chain.merchant
+    amount = chain.w3.to_wei(0.001, "ether")
+    purchase = lambda i: contract.functions.executePurchase(merchant, amount, f"bench-{i}")
+
+    gas = {}
+    new_agent = chain.w3.eth.accounts[2]
+    gas["configureAgent"] = chain.transact(contract.functions.configureAgent(
+        new_agent, "Bench-Agent-2", chain.w3.to_wei(1, "ether"), 60
+    ))["gasUsed"]
+    gas["executePurchase (first)"] = agent_send(chain, purchase(0))
+    gas["executePurchase (steady)"] = agent_send(chain, purchase(1))
+
+    chain.w3.provider.ethereum_tester.time_travel(chain.w3.eth.get_block("latest")["timestamp"] + DAY)
+    gas["executePurchase (day reset)"] = agent_send(chain, purchase(2))
+
+    items = [(merchant, amount, f"bench-{i}") for i in range(batch_size)]
+    gas[f"batchExecutePurchase x{batch_size}"] = agent_send(chain, contract.functions.batchExecutePurchase(items))
+    return gas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gas report: packed vs current AgentPolicy layout")
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {name: measure(path, args.batch_size) for name, path in LAYOUTS}
+    current, packed = results["current"], results["packed"]
+
+    print("=" * 72)
+    print("⛽ GAS REPORT: AgentPolicy storage layout")
+    print(f"{'operation':<30} | {'current':>10} | {'packed':>10} | {'saved':>8} | {'saving':>6}")
+    print("-" * 72)
+    for operation in current:
+        saved = current[operation] - packed[operation]
+        print(f"{operation:<30} | {current[operation]:>10,} | {packed[operation]:>10,} | "
+              f"{saved:>8,} | {saved / current[operation]:>6.1%}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
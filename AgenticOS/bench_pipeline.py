@@ -0,0 +1,136 @@
+import argparse
+import contextlib
+import io
+import logging
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+import requests
+from stats import percentile
+
+# Offline end-to-end benchmark: contract.sol on an in-process EVM, trigger_service
+# on a local thread, the real main_agent loop, and a stub LLM with configurable latency.
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_trigger_service():
+    """Serves trigger_service on a free port with throwaway history and journal DBs; returns its URL."""
+    from werkzeug.serving import make_server
+
+    scratch = tempfile.mkdtemp(prefix="agenticos-bench-")
+    os.environ["HISTORY_DB"] = os.path.join(scratch, "history.db")
+    os.environ["PURCHASE_JOURNAL_DB"] = os.path.join(scratch, "journal.db")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    import trigger_service
+
+    port = free_port()
+    server = make_server("127.0.0.1", port, trigger_service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}", server
+
+
+def make_stub_llm(latency):
+    """Stands in for Gemini: sleeps `latency` seconds, then answers like the prompt RULES."""
+    from agent_brain import rule_engine, WAIT
+
+    def stub(status_data):
+        time.sleep(latency)
+        return rule_engine(status_data) or WAIT
+
+    return stub
+
+
+def bench_decisions(engine, seconds):
+    """Decisions/sec of the engine alone over a spread of statuses."""
+    statuses = [{"load": load, "sub_days": days} for load in range(0, 100, 3) for days in range(0, 20, 2)]
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        engine.decide(statuses[count % len(statuses)])
+        count += 1
+    return count / seconds
+
+
+def bench_pipeline(purchases, llm_latency, fast_path):
+    from agent_brain import DecisionEngine, rule_engine
+    from local_chain import LocalChain
+    import main_agent
+
+    engine = DecisionEngine(rules=rule_engine if fast_path else None, llm=make_stub_llm(llm_latency))
+    chain = LocalChain()
+    body = chain.body()
+    api_url, server = start_trigger_service()
+    session = requests.Session()
+    latencies = []
+
+    agent = threading.Thread(
+        target=main_agent.run,
+        kwargs={"api_url": api_url, "body": body, "decide": engine.decide, "max_purchases": purchases},
+        daemon=True,
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent.start()
+        started = time.perf_counter()
+        for i in range(purchases):
+            trigger = "/trigger/overload" if i % 2 == 0 else "/trigger/sub"
+            version = int(session.get(f"{api_url}/status", timeout=5).headers["X-Status-Version"])
+            triggered_at = time.perf_counter()
+            session.get(f"{api_url}{trigger}", timeout=5)
+            # The trigger is version + 1; the agent's /add_history revert after confirmation is the next one
+            session.get(f"{api_url}/status/poll", params={"since": version + 1, "timeout": 60}, timeout=65)
+            latencies.append(time.perf_counter() - triggered_at)
+        elapsed = time.perf_counter() - started
+        agent.join(timeout=10)
+    server.shutdown()
+
+    history = session.get(f"{api_url}/history", params={"limit": purchases}, timeout=5).json()["items"]
+    gas = [chain.w3.eth.get_transaction_receipt("0x" + item["tx_hash"].removeprefix("0x"))["gasUsed"] for item in history]
+    # Our receipt lookups above are not part of the pipeline
+    rpc_calls = chain.provider.total_calls() - len(gas)
+
+    decision_rate = bench_decisions(engine, 1.0)
+    return {
+        "purchases": len(history),
+        "purchases_per_sec": purchases / elapsed,
+        "decisions_per_sec": decision_rate,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "gas_per_purchase": statistics.mean(gas) if gas else 0,
+        "rpc_calls_per_purchase": rpc_calls / max(1, len(gas)),
+        "rpc_calls_by_method": dict(chain.provider.calls),
+        "engine": engine.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline watch → decide → pay benchmark")
+    parser.add_argument("--purchases", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub LLM latency in seconds")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every status to the (stub) LLM")
+    args = parser.parse_args()
+
+    report = bench_pipeline(args.purchases, args.llm_latency, not args.no_fast_path)
+    print("=" * 40)
+    print("📈 PIPELINE BENCHMARK")
+    print(f"Purchases:              {report['purchases']}")
+    print(f"Purchases/sec:          {report['purchases_per_sec']:.2f}")
+    print(f"Decisions/sec:          {report['decisions_per_sec']:,.0f}")
+    print(f"Watch→confirm p50:      {report['latency_p50_ms']:.1f} ms")
+    print(f"Watch→confirm p99:      {report['latency_p99_ms']:.1f} ms")
+    print(f"Gas per purchase:       {report['gas_per_purchase']:,.0f}")
+    print(f"RPC calls per purchase: {report['rpc_calls_per_purchase']:.2f}")
+    print(f"RPC calls by method:    {report['rpc_calls_by_method']}")
+    print(f"Decision engine:        {report['engine']}")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold-start benchmark: every target runs in a fresh interpreter, as it would
+# when a CLI tool is launched or a crashed agent is restarted.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (interpreter args, budget in seconds or None to just report)
+TARGETS = {
+    "setup_identity (run)": (["setup_identity.py"], 1.0),
+    "trigger_service (import)": (["-c", "import trigger_service"], 1.0),
+    "agent_brain (import)": (["-c", "import agent_brain"], 1.0),
+    "main_agent (import)": (["-c", "import main_agent"], 1.0),
+    # web3 itself dominates this one; it is only paid once the agent actually connects
+    "blockchain_body (import)": (["-c", "import blockchain_body"], None),
+}
+
+
+def time_run(args, env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=HERE, env=env, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(module, env, top=10):
+    """Top imports by cumulative time, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, env=env, check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        if not name.startswith("  "):  # nested imports are indented further
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start times of the AgenticOS entry points")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", metavar="MODULE", help="also list MODULE's slowest top-level imports")
+    args = parser.parse_args()
+
+    # Keep trigger_service's history database out of the working tree
+    env = {**os.environ, "HISTORY_DB": os.path.join(tempfile.mkdtemp(prefix="agenticos-startup-"), "history.db")}
+
+    print("=" * 40)
+    print(f"⏱️ STARTUP BENCHMARK (median of {args.runs})")
+    for name, (target, budget) in TARGETS.items():
+        times = [time_run(target, env) for _ in range(args.runs)]
+        median = statistics.median(times)
+        flag = "ℹ️" if budget is None else "✅" if median < budget else "⚠️"
+        print(f"{flag} {name:<26} {median * 1000:7.0f} ms")
+
+    if args.importtime:
+        print(f"\n🐢 Slowest imports under {args.importtime}:")
+        for cumulative, name in slowest_imports(args.importtime, env):
+            print(f"   {cumulative / 1000:7.0f} ms  {name}")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
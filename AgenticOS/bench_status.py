@@ -0,0 +1,129 @@
+import argparse
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from bench_pipeline import start_trigger_service
+from stats import percentile
+
+# Load generator for trigger_service: many workers hitting /trigger/*, per-system
+# and bulk status reads, and compare-and-set writes across many systems.
+
+MIX = (
+    ("trigger", 0.3),
+    ("status", 0.4),
+    ("bulk", 0.1),
+    ("cas", 0.2),
+)
+
+
+def worker(api_url, systems, deadline, results, lock):
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=1))
+    latencies = {}
+    errors = 0
+    conflicts = 0
+    ops, weights = zip(*MIX)
+    while time.perf_counter() < deadline:
+        op = random.choices(ops, weights)[0]
+        system_id = random.choice(systems)
+        started = time.perf_counter()
+        try:
+            if op == "trigger":
+                kind = random.choice(("overload", "sub"))
+                response = session.get(f"{api_url}/trigger/{system_id}/{kind}", timeout=5)
+            elif op == "status":
+                response = session.get(f"{api_url}/status/{system_id}", timeout=5)
+            elif op == "bulk":
+                ids = ",".join(random.sample(systems, min(20, len(systems))))
+                response = session.get(f"{api_url}/status", params={"ids": ids}, timeout=5)
+            else:
+                version = int(session.get(f"{api_url}/status/{system_id}", timeout=5).headers["X-Status-Version"])
+                response = session.post(f"{api_url}/status/{system_id}", json={
+                    "changes": {"load": random.randint(0, 100)},
+                    "expected_version": version,
+                }, timeout=5)
+                if response.status_code == 409:
+                    conflicts += 1
+            if response.status_code >= 400 and response.status_code != 409:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+            continue
+        latencies.setdefault(op, []).append(time.perf_counter() - started)
+
+    with lock:
+        for op, values in latencies.items():
+            results["latencies"].setdefault(op, []).extend(values)
+        results["errors"] += errors
+        results["conflicts"] += conflicts
+
+
+def run_load(api_url, workers, systems, seconds):
+    system_ids = [f"system-{i}" for i in range(systems)]
+    with requests.Session() as session:
+        for system_id in system_ids:
+            session.put(f"{api_url}/systems/{system_id}", timeout=5).raise_for_status()
+    results = {"latencies": {}, "errors": 0, "conflicts": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=worker, args=(api_url, system_ids, deadline, results, lock), daemon=True)
+        for _ in range(workers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in results["latencies"].values())
+    return {
+        "requests": total,
+        "requests_per_sec": total / elapsed,
+        "errors": results["errors"],
+        "cas_conflicts": results["conflicts"],
+        "by_op": {
+            op: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+            for op, values in sorted(results["latencies"].items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for trigger_service")
+    parser.add_argument("--url", help="running trigger_service (default: start one in-process)")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--systems", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.url
+    if api_url is None:
+        api_url, server = start_trigger_service()
+
+    report = run_load(api_url, args.workers, args.systems, args.seconds)
+    if server is not None:
+        server.shutdown()
+
+    print("=" * 40)
+    print("📈 STATUS SERVICE LOAD TEST")
+    print(f"Workers / systems:      {args.workers} / {args.systems}")
+    print(f"Requests:               {report['requests']:,}")
+    print(f"Requests/sec:           {report['requests_per_sec']:,.0f}")
+    print(f"Errors:                 {report['errors']}")
+    print(f"CAS conflicts (409):    {report['cas_conflicts']}")
+    for op, stats in report["by_op"].items():
+        print(f"  {op:<8} n={stats['count']:<7} p50 {stats['p50_ms']:6.1f} ms   p99 {stats['p99_ms']:6.1f} ms")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,39 @@
 import os
-import json
-from web3 import Web3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from dotenv import load_dotenv, find_dotenv
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+from tx_manager import NonceManager, ConfirmationService, is_nonce_error
+from fee_oracle import FeeOracle, purpose_gas_key
+from rpc_transport import get_web3, batch_call
+from policy_mirror import PolicyMirror
+from contracts import get_contract
+from signer import Signer
+from purchase_journal import PurchaseError, SIGNED, BROADCAST, CONFIRMED, FAILED
+import telemetry
 
 load_dotenv(find_dotenv())
 
+# Seconds a caller waits for its purchase to confirm before giving up on it
+RECEIPT_TIMEOUT = 300
+
+# Node errors meaning the exact tx we re-sent is already in its mempool
+KNOWN_TX_ERRORS = ("already known", "known transaction")
+
 class BlockchainBody:
-    def __init__(self):
-        # 1. Connection Setup
-        rpc_url = os.getenv("RPC_URL")
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+    def __init__(self, w3=None, batch_window=2.0, max_batch_size=50, confirmations=1, confirm_poll_interval=1.0):
+        # 1. Connection Setup: shared pooled/caching provider (w3 can be injected, e.g. an in-process test chain)
+        self.w3 = w3 or get_web3(os.getenv("RPC_URL"))
+
+        # EIP-1559 fees from a rolling block window, cached gas estimates and chain id
+        self.fees = FeeOracle(self.w3)
         
         # 2. Key/Address Setup
         self.agent_private_key = os.getenv("AGENT_PRIVATE_KEY")
         self.agent_address = os.getenv("AGENT_ADDRESS")
+        # The key is turned into a local account once, not on every sign
+        self.signer = Signer([self.agent_private_key])
         
         # Pull Merchant from .env (matching your change)
         merchant = os.getenv("MERCHANT_ADDRESS")
@@ -23,48 +43,387 @@ class BlockchainBody:
         # Ensure address is in Checksum format (prevents ABI errors)
         self.merchant_address = self.w3.to_checksum_address(merchant)
 
-        # 3. Contract Setup
-        self.contract_address = os.getenv("CONTRACT_ADDRESS")
-        with open("abi.json", "r") as f:
-            self.abi = json.load(f)
-        
-        self.contract = self.w3.eth.contract(address=self.contract_address, abi=self.abi)
+        # 3. Contract Setup (ABI parsed once per process, contract built once per connection)
+        self.contract = get_contract(self.w3, os.getenv("CONTRACT_ADDRESS"))
+        self.contract_address = self.contract.address
+        self.abi = self.contract.abi
 
-    def execute_purchase(self, purpose):
-        """Executes the purchase on the blockchain."""
-        amount_wei = self.w3.to_wei(0.001, 'ether')
+        # 4. Local nonce sequencing + one block follower confirming every pending tx
+        self.nonces = NonceManager(self.w3, self.agent_address)
+        self.tracker = ConfirmationService(
+            self.w3, self.nonces,
+            confirmations=confirmations, poll_interval=confirm_poll_interval,
+            on_receipt=self._on_receipt, rebroadcast=self._rebroadcast
+        )
+
+        # Local copy of the contract's rules; doomed purchases are rejected before signing
+        self.policy = PolicyMirror(self.w3, self.contract, self.agent_address)
+        self.last_rejection = None
+
+        # nonce -> (journal, key) of journaled purchases, so fee bumps are journaled too
+        self._journaled = {}
+
+        # 5. Purchase queue flushed through batchExecutePurchase
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._flush_timer = None
+
+    def _on_receipt(self, tx_hash, receipt):
+        if receipt['status'] != 1:
+            telemetry.count("agent_reverts_total")
+            self.policy.invalidate()
+            print(f"❌ Transaction Reverted: {tx_hash.hex()}", flush=True)
 
+    def _rebroadcast(self, tx):
+        """Re-sends a stuck tx under the same nonce with bumped fees; returns (new hash, new tx)."""
+        bumped = self.fees.bump(tx)
+        raw_tx = self.signer.sign(self.agent_address, bumped)
+        journaled = self._journaled.get(tx["nonce"])
+        if journaled is not None:
+            journal, key = journaled
+            journal.advance(key, BROADCAST, tx_hash=Web3.keccak(raw_tx).hex(), raw_tx=raw_tx.hex())
+        telemetry.count("agent_rebroadcasts_total")
+        return self.w3.eth.send_raw_transaction(raw_tx), bumped
+
+    @staticmethod
+    def _record(journal, key, state, **fields):
+        if journal is not None and key is not None:
+            journal.advance(key, state, **fields)
+
+    def preflight(self):
+        """
+        Everything a purchase depends on, fetched in one JSON-RPC batch:
+        pause flag, agent policy, merchant whitelist, vault balance and the
+        pending nonce (which also seeds the local nonce counter and the policy mirror).
+        """
+        paused, agent_info, policy, whitelisted, vault_balance, nonce, latest = batch_call(self.w3, [
+            self.contract.functions.isPaused(),
+            self.contract.functions.getAgentInfo(self.agent_address),
+            self.contract.functions.agents(self.agent_address),
+            self.contract.functions.whitelistedMerchants(self.merchant_address),
+            lambda: self.w3.eth.get_balance(self.contract_address),
+            lambda: self.w3.eth.get_transaction_count(self.agent_address, "pending"),
+            lambda: self.w3.eth.get_block("latest"),
+        ])
+        self.nonces.seed(nonce)
+        self.policy.seed(paused, policy, vault_balance, latest["number"], latest["timestamp"])
+        self.policy.seed_merchant(self.merchant_address, whitelisted)
+        name, remaining_budget, next_allowed, active = agent_info
+        return {
+            "paused": paused,
+            "agent_name": name,
+            "remaining_budget": remaining_budget,
+            "next_allowed_tx_time": next_allowed,
+            "active": active,
+            "merchant_whitelisted": whitelisted,
+            "vault_balance": vault_balance,
+            "nonce": nonce,
+        }
+
+    def check_policy(self, amount_wei, merchants):
+        """
+        Runs a purchase past the local policy mirror. Returns True if it may
+        be sent; otherwise records why in self.last_rejection (the contract
+        error it would revert with and, for cooldown/budget, when to retry).
+        """
+        try:
+            rejection = self.policy.check(amount_wei, merchants)
+        except Exception as e:
+            # The contract enforces the same rules; a mirror we cannot load must not block purchases
+            print(f"⚠️ Policy mirror unavailable ({e}); sending unchecked.", flush=True)
+            return True
+        self.last_rejection = rejection
+        if rejection is None:
+            return True
+        telemetry.count("agent_policy_rejections_total", error=rejection["error"])
+        retry = f" Retry in {rejection['retry_in']}s." if rejection["retry_in"] is not None else ""
+        print(f"🚫 Purchase blocked locally: {rejection['error']} ({rejection['detail']}).{retry}", flush=True)
+        return False
+
+    def _send(self, function_call, wait, gas_key=None, default_gas=None, amount_wei=0, journal=None, key=None):
+        """
+        Builds, signs and broadcasts a contract call from the agent; returns the tx hash hex.
+        Gas is estimated once per gas_key and reused from the fee oracle cache.
+        amount_wei is what the call spends from the vault, applied to the policy mirror on broadcast.
+        With a journal, each step is recorded under `key` before the next one starts.
+        Raises PurchaseError if the tx could not be sent, reverted, was dropped or did not confirm in time.
+        """
+        nonce = None
+        tx_hash = None
         try:
-            # Get nonce for the agent
-            nonce = self.w3.eth.get_transaction_count(self.agent_address)
+            # Reserve the next nonce locally (no RPC once synced)
+            nonce = self.nonces.reserve()
             
-            # Build transaction
-            tx_build = self.contract.functions.executePurchase(
-                self.merchant_address,
-                amount_wei,
-                purpose
-            ).build_transaction({
-                'from': self.agent_address,
-                'nonce': nonce,
-                'gas': 500000, 
-                'gasPrice': self.w3.eth.gas_price,
-                'chainId': 11155111 # Sepolia
-            })
+            # Build transaction (fees and chain id come from the oracle's caches)
+            with telemetry.span("build_tx"):
+                tx_params = self.fees.tx_params(self.agent_address, nonce)
+                tx_params['gas'] = self.fees.estimate_gas(function_call, tx_params, key=gas_key, default=default_gas)
+                tx_build = function_call.build_transaction(tx_params)
 
             # Sign the transaction
-            signed_tx = self.w3.eth.account.sign_transaction(tx_build, self.agent_private_key)
-            
-            # 🚀 THE CRITICAL FIX: Changed .rawTransaction -> .raw_transaction
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            
+            with telemetry.span("sign"):
+                raw_tx = self.signer.sign(self.agent_address, tx_build)
+            tx_hash = Web3.keccak(raw_tx)
+            self._record(journal, key, SIGNED, nonce=nonce, tx_hash=tx_hash.hex(), raw_tx=raw_tx.hex())
+            if journal is not None:
+                self._journaled[nonce] = (journal, key)
+
+            # The confirmation service follows blocks for every pending tx (and rebroadcasts stuck ones).
+            # It learns the hash before the broadcast, so it cannot pass the block that mines it.
+            confirmed = self.tracker.add(tx_hash, nonce, tx_build)
+            with telemetry.span("broadcast"):
+                try:
+                    self.w3.eth.send_raw_transaction(raw_tx)
+                except Exception:
+                    self.tracker.discard(tx_hash)
+                    raise
+            self.nonces.track(nonce, tx_hash)
+            if amount_wei:
+                self.policy.note_sent(tx_hash, amount_wei)
+            self._record(journal, key, BROADCAST)
+
             print(f"⏳ Transaction Sent! Hash: {tx_hash.hex()}")
+            if not wait:
+                return tx_hash.hex()
             
             # Wait for confirmation
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            # Use snake_case for receipt attributes too
-            return receipt.transaction_hash.hex()
+            with telemetry.span("receipt_wait"):
+                receipt = confirmed.result(timeout=RECEIPT_TIMEOUT)
+            self._journaled.pop(nonce, None)
+            return self._settle(journal, key, receipt, tx_hash.hex())
 
+        except PurchaseError:
+            raise
+        except FutureTimeout:
+            # Still pending: the confirmation service keeps following it and the journal keeps it open
+            raise PurchaseError(f"Transaction {tx_hash.hex()} not confirmed after {RECEIPT_TIMEOUT}s", tx_hash.hex())
         except Exception as e:
+            if nonce is not None and nonce not in self.nonces.in_flight():
+                self.nonces.release(nonce)
+            if is_nonce_error(e):
+                self.nonces.invalidate()
+            self.policy.invalidate()
+            if tx_hash is None:
+                self._record(journal, key, FAILED, error=str(e))
+            # Once signed, the journal keeps the raw tx: recovery finds out whether it went out
             print(f"❌ Blockchain Body Error: {e}")
-            return None
\ No newline at end of file
+            raise PurchaseError(str(e), tx_hash.hex() if tx_hash is not None else None) from e
+
+    def _settle(self, journal, key, receipt, sent_hash):
+        """Journals a final receipt (None = dropped); returns the tx hash, or raises PurchaseError unless it succeeded."""
+        if receipt is None and journal is not None and key is not None:
+            # The journal may know hashes the tracker did not follow (e.g. from before a restart)
+            receipt = self._find_receipt(journal.get(key)["tx_hashes"])
+        if receipt is None:
+            self._record(journal, key, FAILED, error="dropped")
+            raise PurchaseError(f"Transaction {sent_hash} was dropped or replaced", sent_hash)
+        # The hash that was mined (a fee bump may have changed it)
+        tx_hash = receipt["transactionHash"].hex()
+        if receipt["status"] != 1:
+            self._record(journal, key, FAILED, tx_hash=tx_hash, error="reverted")
+            raise PurchaseError(f"Transaction {tx_hash} reverted", tx_hash)
+        self._record(journal, key, CONFIRMED, tx_hash=tx_hash)
+        return tx_hash
+
+    def _find_receipt(self, tx_hashes):
+        for tx_hash in reversed(tx_hashes):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def recover_purchase(self, journal, entry):
+        """
+        Finds out what became of a journaled purchase that was signed but
+        never seen to confirm (crash, failed broadcast, timeout). Returns the
+        tx hash if it was mined successfully, or None if it can no longer be
+        mined (marked FAILED, so it may be retried). One still pending is
+        re-sent byte for byte, which can never pay twice: it reuses its nonce.
+        Raises PurchaseError if it reverted or does not confirm in time.
+        """
+        key = entry["key"]
+        # Nonce count first: a tx mined between the two reads then still shows up as a receipt
+        mined = self.w3.eth.get_transaction_count(self.agent_address, "latest")
+        receipt = self._find_receipt(entry["tx_hashes"])
+        if receipt is not None:
+            return self._settle(journal, key, receipt, entry["tx_hash"])
+
+        if entry["nonce"] is None or entry["nonce"] < mined or not entry["raw_tx"]:
+            # Its nonce went to another transaction: this one can never be mined
+            journal.advance(key, FAILED, error="never mined")
+            return None
+
+        print(f"🔁 Re-sending journaled transaction {entry['tx_hash']} (nonce {entry['nonce']})...", flush=True)
+        # Tracked before the re-send, like in _send, so its block cannot slip past the follower
+        tx_hash = bytes.fromhex(entry["tx_hash"].removeprefix("0x"))
+        confirmed = self.tracker.add(tx_hash, entry["nonce"])
+        try:
+            self.w3.eth.send_raw_transaction(bytes.fromhex(entry["raw_tx"]))
+        except Exception as e:
+            if not any(fragment in str(e).lower() for fragment in KNOWN_TX_ERRORS):
+                self.tracker.discard(tx_hash)
+                if not is_nonce_error(e):
+                    raise PurchaseError(f"Re-send failed: {e}", entry["tx_hash"]) from e
+                # Maybe the nonce was used up in the meantime (maybe by this very tx), but
+                # "nonce too high" or "replacement underpriced" leave the original possibly pending
+                mined = self.w3.eth.get_transaction_count(self.agent_address, "latest")
+                receipt = self._find_receipt(entry["tx_hashes"])
+                if receipt is not None:
+                    return self._settle(journal, key, receipt, entry["tx_hash"])
+                if entry["nonce"] < mined:
+                    journal.advance(key, FAILED, error="never mined")
+                    return None
+                journal.advance(key, BROADCAST)
+                raise PurchaseError(f"Re-send rejected ({e}); nonce {entry['nonce']} still open", entry["tx_hash"]) from e
+        journal.advance(key, BROADCAST)
+        # A fresh process has not seen this nonce yet; resync before the next purchase
+        self.nonces.invalidate()
+        try:
+            receipt = confirmed.result(timeout=RECEIPT_TIMEOUT)
+        except FutureTimeout:
+            raise PurchaseError(f"Transaction {entry['tx_hash']} not confirmed after {RECEIPT_TIMEOUT}s", entry["tx_hash"])
+        return self._settle(journal, key, receipt, entry["tx_hash"])
+
+    def recheck_failed(self, journal, entry):
+        """
+        Makes sure a FAILED purchase really did not go through before it is
+        retried: none of its hashes may have a successful receipt, and its
+        nonce must have gone to another transaction. A purchase that was
+        mined after all is journaled as CONFIRMED; one whose nonce is still
+        unused goes back to BROADCAST so it is recovered, not paid again.
+        Returns the entry as journaled now.
+        """
+        key = entry["key"]
+        if not entry["tx_hashes"]:
+            return entry  # never signed: nothing can be on chain
+        receipt = self._find_receipt(entry["tx_hashes"])
+        if receipt is not None:
+            if receipt["status"] == 1:
+                print(f"🔁 Purchase journaled as failed was mined: {receipt['transactionHash'].hex()}", flush=True)
+                journal.advance(key, CONFIRMED, tx_hash=receipt["transactionHash"].hex(), error=None)
+            return journal.get(key)
+        mined = self.w3.eth.get_transaction_count(self.agent_address, "latest")
+        if entry["nonce"] is not None and entry["nonce"] >= mined and entry["raw_tx"]:
+            journal.advance(key, BROADCAST, error=None)
+        return journal.get(key)
+
+    def execute_purchase(self, purpose, wait=True, journal=None, key=None):
+        """
+        Executes the purchase on the blockchain and returns the tx hash.
+        With wait=False it returns right after broadcast and the receipt is
+        collected by the confirmation service (self.tracker).
+        Returns None without sending anything if the policy mirror knows the
+        contract would revert; self.last_rejection says why. Any other
+        failure, a revert included, raises PurchaseError.
+        With a PurchaseJournal, every step is journaled under `key`.
+        """
+        amount_wei = self.w3.to_wei(0.001, 'ether')
+        if not self.check_policy(amount_wei, [self.merchant_address]):
+            return None
+        function_call = self.contract.functions.executePurchase(
+            self.merchant_address,
+            amount_wei,
+            purpose
+        )
+        return self._send(
+            function_call, wait,
+            gas_key=purpose_gas_key("executePurchase", purpose), default_gas=500000, amount_wei=amount_wei,
+            journal=journal, key=key
+        )
+
+    def execute_batch(self, purchases, wait=True):
+        """
+        Executes several purchases in one batchExecutePurchase transaction.
+        Each item is a purpose string or a (merchant, amount_wei, purpose) tuple.
+        Gas grows with the batch size and the purpose lengths, so both are part of the estimate key.
+        """
+        items = [self._batch_item(purchase) for purchase in purchases]
+        if not items:
+            return None
+        total_wei = sum(amount_wei for _, amount_wei, _ in items)
+        if not self.check_policy(total_wei, {merchant for merchant, _, _ in items}):
+            return None
+        purpose_words = sum(purpose_gas_key("batchExecutePurchase", purpose)[1] for _, _, purpose in items)
+        gas_key = ("batchExecutePurchase", len(items), purpose_words)
+        return self._send(self.contract.functions.batchExecutePurchase(items), wait, gas_key=gas_key, amount_wei=total_wei)
+
+    def _batch_item(self, purchase):
+        """(merchant, amount_wei, purpose) for a batch; raises ValueError for a malformed item."""
+        if isinstance(purchase, str):
+            return (self.merchant_address, self.w3.to_wei(0.001, 'ether'), purchase)
+        merchant, amount_wei, purpose = purchase
+        if isinstance(amount_wei, bool) or not isinstance(amount_wei, int) or amount_wei <= 0:
+            raise ValueError(f"Invalid purchase amount: {amount_wei!r} wei")
+        if not isinstance(purpose, str):
+            raise ValueError(f"Invalid purchase purpose: {purpose!r}")
+        return (self.w3.to_checksum_address(merchant), amount_wei, purpose)
+
+    def queue_purchase(self, purpose, merchant=None, amount_wei=None):
+        """
+        Queues a purchase for the next batch flush and returns a Future that
+        resolves to the batch tx hash (None if the policy mirror rejected the
+        batch; PurchaseError if it failed).
+        The queue is flushed on a timer thread batch_window seconds after the
+        first item, or as soon as max_batch_size items are waiting; the caller
+        never waits on the flush itself.
+        A malformed item raises ValueError here, before it can hold up a batch.
+        """
+        item = self._batch_item((
+            merchant or self.merchant_address,
+            amount_wei if amount_wei is not None else self.w3.to_wei(0.001, 'ether'),
+            purpose
+        ))
+        future = Future()
+        with self._queue_lock:
+            self._queue.append((item, future))
+            if len(self._queue) == self.max_batch_size:
+                self._schedule_flush(0)
+            elif self._flush_timer is None:
+                self._schedule_flush(self.batch_window)
+        return future
+
+    def _schedule_flush(self, delay):
+        """Replaces the pending flush timer with one firing in `delay` seconds. Call with _queue_lock held."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(delay, self.flush_batch)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def flush_batch(self, wait=True):
+        """Sends everything currently queued as one batch; returns its tx hash, or None if nothing went through."""
+        with self._queue_lock:
+            queued, self._queue = self._queue[:self.max_batch_size], self._queue[self.max_batch_size:]
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._queue:
+                self._schedule_flush(0 if len(self._queue) >= self.max_batch_size else self.batch_window)
+
+        if not queued:
+            return None
+        print(f"📦 Flushing batch of {len(queued)} purchases...", flush=True)
+        try:
+            tx_hash = self.execute_batch([item for item, _ in queued], wait=wait)
+        except Exception as e:
+            # Also runs on the timer thread: any failure is delivered through the futures,
+            # so no caller is left waiting on a batch that never went out
+            for _, future in queued:
+                future.set_exception(e)
+            return None
+        for _, future in queued:
+            future.set_result(tx_hash)
+        return tx_hash
+
+    def submit_purchase(self, purpose):
+        """Broadcast-only purchase; returns the tx hash without waiting for a receipt."""
+        return self.execute_purchase(purpose, wait=False)
+
+    def wait_for_purchase(self, tx_hash, timeout=120):
+        """Waits for a purchase sent with submit_purchase; returns the receipt or None."""
+        if isinstance(tx_hash, str):
+            tx_hash = bytes.fromhex(tx_hash.removeprefix("0x"))
+        return self.tracker.wait(tx_hash, timeout)
\ No newline at end of file
@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+from functools import lru_cache
+
+# Resolved against this package, not the working directory, so tools run from anywhere
+ABI_PATH = os.getenv("CONTRACT_ABI_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "abi.json")
+
+
+@lru_cache(maxsize=None)
+def load_abi(path=ABI_PATH):
+    """Parsed contract ABI, read once per process. Shared between callers: do not mutate it."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+_contracts = {}
+_contracts_lock = threading.Lock()
+
+
+def get_contract(w3, address=None, abi_path=ABI_PATH):
+    """
+    Contract object for `address` (default: CONTRACT_ADDRESS) on `w3`.
+    The ABI is parsed once and the contract factory and instance are built
+    once per connection, so every BlockchainBody, dashboard rerun or
+    restarted loop on the same Web3 reuses them. Works for AsyncWeb3 too.
+    """
+    address = w3.to_checksum_address(address or os.getenv("CONTRACT_ADDRESS"))
+    key = (id(w3), address, abi_path)
+    with _contracts_lock:
+        entry = _contracts.get(key)
+        # The Web3 is kept in the entry so its id() cannot be reused by another connection
+        if entry is None or entry[0] is not w3:
+            factory = w3.eth.contract(abi=load_abi(abi_path))
+            entry = _contracts[key] = (w3, factory(address=address))
+        return entry[1]
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from web3 import Web3
+from dotenv import load_dotenv, find_dotenv
+from contracts import get_contract
+
+load_dotenv(find_dotenv())
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events.db")
+
+INDEXED_EVENTS = ("PurchaseReceipt", "AgentConfigured", "MerchantAuthorized", "SystemStatus")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    event TEXT NOT NULL,
+    agent TEXT,
+    merchant TEXT,
+    amount TEXT,
+    args TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS idx_events_event ON events(event, block_number);
+CREATE INDEX IF NOT EXISTS idx_events_agent ON events(agent, block_number);
+CREATE INDEX IF NOT EXISTS idx_events_merchant ON events(merchant, block_number);
+CREATE INDEX IF NOT EXISTS idx_events_tx_hash ON events(tx_hash);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    number INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_block INTEGER NOT NULL
+);
+"""
+
+
+def _hex(value):
+    if isinstance(value, str):
+        return Web3.to_hex(hexstr=value)
+    return Web3.to_hex(value)
+
+
+class EventStore:
+    """Local SQLite copy of the contract's events plus the indexer checkpoint."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("EVENTS_DB", DEFAULT_DB_PATH)
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Indexer side ---
+
+    def last_block(self):
+        row = self._connect().execute("SELECT last_block FROM checkpoint WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def commit_range(self, events, block_hashes, last_block):
+        """Stores a scanned block range atomically: its events, block hashes and the new checkpoint."""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(
+                    e["block_number"], e["log_index"], e["block_hash"], e["tx_hash"], e["event"],
+                    e.get("agent"), e.get("merchant"), e.get("amount"), json.dumps(e["args"]),
+                ) for e in events],
+            )
+            conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?)", block_hashes.items())
+            conn.execute("INSERT OR REPLACE INTO checkpoint VALUES (1, ?)", (last_block,))
+
+    def recent_blocks(self, since_block):
+        """(number, hash) of tracked blocks at or above since_block, newest first."""
+        return self._connect().execute(
+            "SELECT number, hash FROM blocks WHERE number >= ? ORDER BY number DESC", (since_block,)
+        ).fetchall()
+
+    def rollback(self, to_block):
+        """Forgets everything after to_block (used when a reorg replaced those blocks)."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM events WHERE block_number > ?", (to_block,))
+            conn.execute("DELETE FROM blocks WHERE number > ?", (to_block,))
+            conn.execute("INSERT OR REPLACE INTO checkpoint VALUES (1, ?)", (to_block,))
+
+    def prune_blocks(self, below_block):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM blocks WHERE number < ?", (below_block,))
+
+    # --- Query side ---
+
+    def events(self, event=None, agent=None, merchant=None, from_block=None, limit=1000):
+        clauses, params = [], []
+        for column, value in (("event", event), ("agent", agent), ("merchant", merchant)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if from_block is not None:
+            clauses.append("block_number >= ?")
+            params.append(from_block)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT block_number, log_index, tx_hash, event, args FROM events {where} "
+            f"ORDER BY block_number DESC, log_index DESC LIMIT ?",
+            (*params, limit),
+        )
+        return [{
+            "block_number": block_number,
+            "log_index": log_index,
+            "tx_hash": tx_hash,
+            "event": name,
+            **json.loads(args),
+        } for block_number, log_index, tx_hash, name, args in rows]
+
+    def purchases(self, agent=None, merchant=None, limit=1000):
+        return self.events("PurchaseReceipt", agent=agent, merchant=merchant, limit=limit)
+
+    def spend_by_agent(self):
+        """Total wei spent per agent, summed exactly in Python (amounts are uint256)."""
+        totals = {}
+        rows = self._connect().execute("SELECT agent, amount FROM events WHERE event = 'PurchaseReceipt'")
+        for agent, amount in rows:
+            totals[agent] = totals.get(agent, 0) + int(amount)
+        return totals
+
+
+class EventIndexer:
+    """
+    Incrementally copies AgenticCommerceOS_Master events into an EventStore.
+    eth_getLogs ranges grow while the node keeps up and shrink when it
+    refuses a range. Block hashes near the head are remembered so a reorg
+    rolls the store back to the common ancestor before rescanning.
+    """
+
+    def __init__(self, w3, contract, store, start_block=0, confirmations=2,
+                 reorg_depth=64, initial_chunk=1000, min_chunk=1, max_chunk=10000):
+        self.w3 = w3
+        self.contract = contract
+        self.store = store
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.reorg_depth = reorg_depth
+        self.chunk = initial_chunk
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.events = {name: contract.events[name]() for name in INDEXED_EVENTS}
+        self.topics = {_hex(event.topic): event for event in self.events.values()}
+
+    def check_reorg(self, head):
+        """Rolls the store back if any tracked block near the head was replaced."""
+        tracked = self.store.recent_blocks(head - self.reorg_depth)
+        for number, stored_hash in tracked:
+            if number > head:
+                continue
+            if _hex(self.w3.eth.get_block(number)["hash"]) == stored_hash:
+                if number != tracked[0][0]:
+                    print(f"⚠️ Reorg detected, rolling back to block {number}", flush=True)
+                    self.store.rollback(number)
+                return
+        if tracked:
+            fork_point = tracked[-1][0] - 1
+            print(f"⚠️ Deep reorg detected, rolling back to block {fork_point}", flush=True)
+            self.store.rollback(fork_point)
+
+    def fetch_logs(self, from_block, to_block):
+        return self.w3.eth.get_logs({
+            "address": self.contract.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [list(self.topics)],
+        })
+
+    def decode(self, log):
+        event = self.topics[_hex(log["topics"][0])]
+        decoded = event.process_log(log)
+        args = dict(decoded["args"])
+        record = {
+            "block_number": decoded["blockNumber"],
+            "log_index": decoded["logIndex"],
+            "block_hash": _hex(decoded["blockHash"]),
+            "tx_hash": _hex(decoded["transactionHash"]),
+            "event": decoded["event"],
+            "agent": args.get("agent"),
+            "merchant": args.get("merchant"),
+        }
+        for key in ("amount", "limit"):
+            if key in args:
+                args[key] = str(args[key])  # uint256 does not fit SQLite/JSON integers
+        record["amount"] = args.get("amount")
+        record["args"] = args
+        return record
+
+    def sync(self):
+        """Indexes everything up to head - confirmations. Returns the number of new events."""
+        head = self.w3.eth.block_number
+        self.check_reorg(head)
+
+        target = head - self.confirmations
+        last = self.store.last_block()
+        from_block = self.start_block if last is None else last + 1
+        indexed = 0
+
+        while from_block <= target:
+            to_block = min(from_block + self.chunk - 1, target)
+            try:
+                logs = self.fetch_logs(from_block, to_block)
+            except Exception as e:
+                if self.chunk <= self.min_chunk:
+                    raise
+                self.chunk = max(self.min_chunk, self.chunk // 2)
+                print(f"⚠️ get_logs failed ({e}); shrinking range to {self.chunk} blocks", flush=True)
+                continue
+
+            events = [self.decode(log) for log in logs]
+            block_hashes = {e["block_number"]: e["block_hash"] for e in events}
+            if to_block > head - self.reorg_depth:
+                block_hashes[to_block] = _hex(self.w3.eth.get_block(to_block)["hash"])
+            self.store.commit_range(events, block_hashes, to_block)
+
+            indexed += len(events)
+            from_block = to_block + 1
+            self.chunk = min(self.max_chunk, self.chunk * 2)
+
+        self.store.prune_blocks(head - self.reorg_depth)
+        return indexed
+
+    def run(self, poll_interval=12):
+        print(f"🔎 Indexing events for {self.contract.address}...", flush=True)
+        while True:
+            try:
+                count = self.sync()
+                if count:
+                    print(f"📥 Indexed {count} new events (checkpoint: {self.store.last_block()})", flush=True)
+            except Exception as e:
+                print(f"⚠️ Indexer Error: {e}", flush=True)
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index AgenticCommerceOS_Master events into a local store")
+    parser.add_argument("--from-block", type=int, default=int(os.getenv("CONTRACT_DEPLOY_BLOCK", "0")))
+    parser.add_argument("--confirmations", type=int, default=2)
+    parser.add_argument("--follow", action="store_true", help="keep indexing new blocks")
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(os.getenv("RPC_URL")))
+    contract = get_contract(w3)
+    indexer = EventIndexer(w3, contract, EventStore(), start_block=args.from_block, confirmations=args.confirmations)
+
+    if args.follow:
+        indexer.run()
+    else:
+        print(f"📥 Indexed {indexer.sync()} new events (checkpoint: {indexer.store.last_block()})")
+
+
+if __name__ == "__main__":
+    main()
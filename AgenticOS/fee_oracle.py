@@ -0,0 +1,148 @@
+import statistics
+import threading
+import time
+from collections import deque
+
+
+class FeeOracle:
+    """
+    EIP-1559 fee and gas source for one connection.
+
+    Base fee and priority fee are tracked over a rolling window of recent
+    blocks (one eth_feeHistory call per refresh_interval), gas estimates are
+    cached per caller-supplied key, and the chain id is read once.
+    """
+
+    def __init__(self, w3, window=20, reward_percentile=50, base_fee_multiplier=2,
+                 refresh_interval=12, gas_margin=1.2):
+        self.w3 = w3
+        self.window = window
+        self.reward_percentile = reward_percentile
+        self.base_fee_multiplier = base_fee_multiplier
+        self.refresh_interval = refresh_interval
+        self.gas_margin = gas_margin
+
+        self._lock = threading.Lock()
+        self._chain_id = None
+        self._blocks = deque(maxlen=window)  # (block number, base fee, priority fee)
+        self._next_base_fee = None
+        self._tip = None
+        self._refreshed_at = 0
+        self._legacy = False
+        self._gas_estimates = {}
+
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def refresh(self, force=False):
+        """Pulls the recent fee window from the node if the cached one is stale."""
+        with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return
+            history = self.w3.eth.fee_history(self.window, "latest", [self.reward_percentile])
+            base_fees = history.get("baseFeePerGas") or []
+            rewards = history.get("reward") or []
+
+            if base_fees:
+                # baseFeePerGas has one extra entry: the base fee of the next block
+                oldest = history["oldestBlock"]
+                for offset, reward in enumerate(rewards):
+                    number = oldest + offset
+                    if not self._blocks or number > self._blocks[-1][0]:
+                        self._blocks.append((number, base_fees[offset], reward[0] if reward else 0))
+                self._next_base_fee = base_fees[-1]
+            else:
+                # Node without fee history (fresh dev chains): fall back to the latest block
+                latest = self.w3.eth.get_block("latest")
+                if "baseFeePerGas" not in latest:
+                    self._legacy = True
+                else:
+                    self._next_base_fee = latest["baseFeePerGas"]
+                    if not self._blocks or latest["number"] > self._blocks[-1][0]:
+                        self._blocks.append((latest["number"], latest["baseFeePerGas"], 0))
+
+            if not self._legacy:
+                tips = [tip for _, _, tip in self._blocks if tip > 0]
+                self._tip = int(statistics.median(tips)) if tips else self.w3.eth.max_priority_fee
+            self._refreshed_at = time.monotonic()
+
+    def priority_fee(self):
+        """Median priority fee paid over the window (the node's suggestion if blocks were empty)."""
+        self.refresh()
+        return self._tip
+
+    def fee_params(self):
+        """
+        Fee fields for a transaction. maxFeePerGas leaves room for the base
+        fee to grow base_fee_multiplier times while the tx waits, and never
+        goes below the highest base fee seen in the window.
+        """
+        self.refresh()
+        if self._legacy:
+            return {"gasPrice": self.w3.eth.gas_price}
+
+        tip = self.priority_fee()
+        peak_base = max([base for _, base, _ in self._blocks] + [self._next_base_fee])
+        max_fee = max(self._next_base_fee * self.base_fee_multiplier, peak_base) + tip
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": tip, "type": 2}
+
+    def bump(self, tx, factor=1.125):
+        """
+        Copy of `tx` priced to replace it (same nonce): every fee field at
+        least `factor` times the old one (nodes require +10%), and never
+        below what the current window suggests.
+        """
+        self.refresh(force=True)
+        current = self.fee_params()
+        bumped = dict(tx)
+        if "gasPrice" in tx:
+            bumped["gasPrice"] = max(int(tx["gasPrice"] * factor) + 1, current.get("gasPrice", 0))
+            return bumped
+        tip = max(int(tx["maxPriorityFeePerGas"] * factor) + 1, current.get("maxPriorityFeePerGas", 0))
+        max_fee = max(int(tx["maxFeePerGas"] * factor) + 1, current.get("maxFeePerGas", 0))
+        bumped["maxPriorityFeePerGas"] = tip
+        bumped["maxFeePerGas"] = max(max_fee, tip)
+        return bumped
+
+    def tx_params(self, sender, nonce, **extra):
+        """Base transaction dict: sender, nonce, cached chain id and current fees."""
+        return {"from": sender, "nonce": nonce, "chainId": self.chain_id, **self.fee_params(), **extra}
+
+    def estimate_gas(self, function_call, tx_params, key=None, default=None):
+        """
+        Gas limit for a contract call, padded by gas_margin. Estimates are
+        cached under `key` (callers pick a key that captures what drives gas,
+        e.g. the purpose length). Falls back to `default` if estimation fails.
+        """
+        if key is not None and key in self._gas_estimates:
+            return self._gas_estimates[key]
+        try:
+            params = {k: v for k, v in tx_params.items() if k in ("from", "value")}
+            gas = int(function_call.estimate_gas(params) * self.gas_margin)
+        except Exception as e:
+            if default is None:
+                raise
+            print(f"⚠️ Gas estimation failed ({e}); using {default}", flush=True)
+            return default
+        if key is not None:
+            self._gas_estimates[key] = gas
+        return gas
+
+    def stats(self):
+        base_fees = [base for _, base, _ in self._blocks]
+        return {
+            "chain_id": self._chain_id,
+            "blocks": len(self._blocks),
+            "next_base_fee": self._next_base_fee,
+            "avg_base_fee": int(statistics.mean(base_fees)) if base_fees else None,
+            "priority_fee": self._tip,
+            "cached_gas_estimates": len(self._gas_estimates),
+        }
+
+
+def purpose_gas_key(function_name, purpose):
+    """Gas key for calls whose cost scales with the purpose string (32-byte words)."""
+    return (function_name, (len(purpose.encode()) + 31) // 32)
@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import aiohttp
+from web3 import AsyncWeb3, Web3
+from dotenv import load_dotenv, find_dotenv
+from agent_brain import get_ai_decision, get_ai_decisions, rule_engine, get_decision_stats, parse_defer, WAIT
+from main_agent import parse_decision, status_url
+from status_registry import DEFAULT_SYSTEM
+from rate_limiter import Backoff
+from contracts import get_contract
+from fee_oracle import FeeOracle, purpose_gas_key
+from rpc_transport import get_web3
+from signer import Signer
+from tx_manager import NonceManager, ConfirmationService, is_nonce_error
+
+load_dotenv(find_dotenv())
+
+POLL_TIMEOUT = 30
+
+
+def load_fleet_config(path):
+    """
+    Reads a fleet config file (see fleet.example.json). Private keys can be
+    given inline or, preferably, as the name of an env var.
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+
+    agents = []
+    for entry in config.get("agents", []):
+        key = entry.get("private_key") or os.getenv(entry.get("private_key_env", ""))
+        if not key:
+            raise ValueError(f"❌ No private key for agent {entry.get('name')} in {path}")
+        agents.append({**entry, "private_key": key})
+    if not agents:
+        raise ValueError(f"❌ No agents defined in {path}")
+
+    return {
+        "rpc_url": config.get("rpc_url") or os.getenv("RPC_URL"),
+        "status_url": config.get("status_url", "http://127.0.0.1:5001"),
+        "contract_address": config.get("contract_address") or os.getenv("CONTRACT_ADDRESS"),
+        "llm_concurrency": config.get("llm_concurrency", 2),
+        "llm_batch_window": config.get("llm_batch_window", 0.25),
+        "max_connections": config.get("max_connections", 100),
+        "agents": agents,
+    }
+
+
+class Fleet:
+    """
+    Shared resources for every agent: one RPC client, one HTTP pool, one LLM
+    limiter and batcher, one signer pool and one confirmation follower.
+    """
+
+    def __init__(self, config, session, w3, contract):
+        self.config = config
+        self.session = session
+        self.w3 = w3
+        self.contract = contract
+        # Transactions are built like BlockchainBody._send builds them: EIP-1559 fees and cached gas
+        # estimates from one FeeOracle. It is synchronous, so it gets the shared pooled Web3 and runs in threads
+        self.sync_w3 = get_web3(config["rpc_url"])
+        self.sync_contract = get_contract(self.sync_w3, config["contract_address"])
+        self.fees = FeeOracle(self.sync_w3)
+        # One block follower confirms every agent's txs; each agent passes its own NonceManager
+        self.tracker = ConfirmationService(self.sync_w3)
+        self.llm_limiter = asyncio.Semaphore(config["llm_concurrency"])
+        self.batch_window = config["llm_batch_window"]
+        self._batch = {}  # agent name -> (status, future)
+        self._flusher = None
+        # Every agent key is loaded once. A single tx is signed inline (a few ms, cheaper than
+        # the IPC); batches of min_pool_batch or more go to worker processes, off the event loop
+        self.signer = Signer([entry["private_key"] for entry in config["agents"]])
+
+    async def sign(self, address, tx):
+        raw_txs = await asyncio.wrap_future(self.signer.submit([(address, tx)]))
+        return raw_txs[0]
+
+    async def decide(self, name, status):
+        """
+        Rule hits are answered inline. LLM escalations are collected for
+        batch_window seconds and decided together in one batched request.
+        """
+        if rule_engine(status) is not None:
+            return get_ai_decision(status)
+        future = asyncio.get_running_loop().create_future()
+        self._batch[name] = (status, future)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        batch, self._batch, self._flusher = self._batch, {}, None
+        try:
+            async with self.llm_limiter:
+                decisions = await asyncio.to_thread(
+                    get_ai_decisions, {name: status for name, (status, _) in batch.items()}
+                )
+        except Exception as e:
+            decisions = {}
+            print(f"⚠️ Batch decision failed: {e}", flush=True)
+        for name, (_, future) in batch.items():
+            if not future.done():
+                future.set_result(decisions.get(name, WAIT))
+
+
+class FleetAgent:
+    """One agent's watch → decide → pay cycle."""
+
+    def __init__(self, fleet, entry):
+        self.fleet = fleet
+        self.name = entry.get("name", entry["address"])
+        self.address = fleet.signer.address_for(entry["private_key"])
+        if entry.get("address") and entry["address"].lower() != self.address.lower():
+            raise ValueError(f"❌ Address/key mismatch for agent {self.name}")
+        self.merchant = AsyncWeb3.to_checksum_address(entry.get("merchant") or os.getenv("MERCHANT_ADDRESS"))
+        self.amount_wei = AsyncWeb3.to_wei(entry.get("amount_eth", 0.001), "ether")
+        self.status_url = entry.get("status_url", fleet.config["status_url"])
+        # One trigger_service can monitor the whole fleet, one system per agent
+        self.system_id = entry.get("system_id", DEFAULT_SYSTEM)
+        self.nonces = NonceManager(fleet.sync_w3, self.address)
+
+    def log(self, message):
+        print(f"[{self.name}] {message}", flush=True)
+
+    async def wait_for_change(self, since, timeout=POLL_TIMEOUT):
+        async with self.fleet.session.get(
+            f"{status_url(self.status_url, self.system_id)}/poll",
+            params={"since": since, "timeout": timeout},
+            timeout=aiohttp.ClientTimeout(total=timeout + 5),
+        ) as response:
+            data = await response.json()
+        return data["version"], data["status"]
+
+    def build_tx(self, reason):
+        """Reserves the next nonce and builds the purchase tx (blocking: fee and gas caches may need RPC)."""
+        fees = self.fleet.fees
+        nonce = self.nonces.reserve()
+        try:
+            function_call = self.fleet.sync_contract.functions.executePurchase(self.merchant, self.amount_wei, reason)
+            tx_params = fees.tx_params(self.address, nonce)
+            tx_params["gas"] = fees.estimate_gas(
+                function_call, tx_params, key=purpose_gas_key("executePurchase", reason), default=500000
+            )
+            return function_call.build_transaction(tx_params)
+        except Exception:
+            self.nonces.release(nonce)
+            raise
+
+    async def register(self):
+        """Registers this agent's system with trigger_service before watching it (unknown systems 404)."""
+        async with self.fleet.session.put(
+            f"{self.status_url}/systems/{self.system_id}", timeout=aiohttp.ClientTimeout(total=5)
+        ) as response:
+            if response.status not in (404, 405):
+                response.raise_for_status()
+
+    async def pay(self, reason):
+        tracker = self.fleet.tracker
+        tx = await asyncio.to_thread(self.build_tx, reason)
+        tx_hash = None
+        try:
+            raw_tx = await self.fleet.sign(self.address, tx)
+            tx_hash = Web3.keccak(raw_tx)
+            # Registered before the broadcast, so the follower cannot pass the block that mines it
+            confirmed = tracker.add(tx_hash, tx["nonce"], nonce_manager=self.nonces)
+            await self.fleet.w3.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            if tx_hash is not None:
+                tracker.discard(tx_hash)
+            self.nonces.release(tx["nonce"])
+            if is_nonce_error(e):
+                self.nonces.invalidate()
+            raise
+        self.nonces.track(tx["nonce"], tx_hash)
+        self.log(f"⏳ Transaction Sent! Hash: {tx_hash.hex()}")
+
+        receipt = await asyncio.wrap_future(confirmed)
+        if receipt is None:
+            raise RuntimeError(f"Transaction dropped: {tx_hash.hex()}")
+        if receipt["status"] != 1:
+            raise RuntimeError(f"Transaction reverted: {tx_hash.hex()}")
+        return tx_hash.hex()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        version = 0
+        status = None
+        retry_at = None  # re-evaluate the current status at this time (quota deferral, failed payment)
+        backoff = Backoff(base=1, cap=60)
+        registered = False
+        while True:
+            try:
+                if not registered:
+                    await self.register()
+                    registered = True
+                timeout = POLL_TIMEOUT if retry_at is None else max(0.0, retry_at - loop.time())
+                new_version, new_status = await self.wait_for_change(version, timeout)
+                if new_version != version:
+                    version, status, retry_at = new_version, new_status, None
+                elif retry_at is None or loop.time() < retry_at:
+                    continue
+
+                decision = await self.fleet.decide(self.name, status)
+                retry_in = parse_defer(decision)
+                if retry_in is not None:
+                    retry_at = loop.time() + retry_in
+                    continue
+
+                reason = parse_decision(decision)
+                retry_at = None
+                if reason is not None:
+                    self.log(f"🧠 AI DECISION: {decision}")
+
+                    try:
+                        tx_hash = await self.pay(reason)
+                    except Exception as e:
+                        delay = backoff.next()
+                        self.log(f"⚠️ Payment failed: {e}. Retrying in {delay:.1f}s...")
+                        retry_at = loop.time() + delay
+                        continue
+                    backoff.reset()
+                    self.log(f"✅ TRANSACTION SUCCESS: {tx_hash}")
+
+                    async with self.fleet.session.post(f"{self.status_url}/add_history", json={
+                        "timestamp": time.strftime("%H:%M:%S"),
+                        "reason": reason,
+                        "tx_hash": tx_hash,
+                        "agent": self.name,
+                        "system_id": self.system_id,
+                    }, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                        await response.read()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = backoff.next()
+                self.log(f"⚠️ Runtime Error: {e}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+
+async def run_fleet(config):
+    connector = aiohttp.TCPConnector(limit=config["max_connections"])
+    async with aiohttp.ClientSession(connector=connector) as session:
+        provider = AsyncWeb3.AsyncHTTPProvider(config["rpc_url"])
+        await provider.cache_async_session(session)
+        w3 = AsyncWeb3(provider)
+
+        contract = get_contract(w3, config["contract_address"])
+
+        fleet = Fleet(config, session, w3, contract)
+        agents = [FleetAgent(fleet, entry) for entry in config["agents"]]
+        print(f"🚀 Fleet of {len(agents)} agents is online and watching...", flush=True)
+        try:
+            await asyncio.gather(*(agent.run() for agent in agents))
+        finally:
+            fleet.signer.close()
+            print(f"📈 Decision Stats: {get_decision_stats()}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many agents concurrently in one process")
+    parser.add_argument("config", nargs="?", default="fleet.json", help="fleet config file")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_fleet(load_fleet_config(args.config)))
+    except KeyboardInterrupt:
+        print("🛑 Fleet stopped.", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    timestamp TEXT,
+    reason TEXT,
+    tx_hash TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_created_at ON purchases(created_at);
+CREATE INDEX IF NOT EXISTS idx_purchases_reason ON purchases(reason, id);
+"""
+
+# One row per tx hash, so a re-sent report cannot be recorded twice. Databases from before the
+# constraint keep their oldest row per hash and swap the plain index for the unique one.
+TX_HASH_INDEX = "idx_purchases_tx_hash_unique"
+TX_HASH_MIGRATION = f"""
+DELETE FROM purchases WHERE tx_hash IS NOT NULL AND id NOT IN (
+    SELECT MIN(id) FROM purchases WHERE tx_hash IS NOT NULL GROUP BY tx_hash
+);
+DROP INDEX IF EXISTS idx_purchases_tx_hash;
+CREATE UNIQUE INDEX {TX_HASH_INDEX} ON purchases(tx_hash);
+"""
+
+
+class HistoryStore:
+    """
+    Durable purchase history in SQLite. Rows are addressed by their
+    autoincrement id, which doubles as the pagination cursor: pages walk
+    backwards (newest first) from `cursor`, and `since` fetches walk
+    forwards from the last id a client has seen.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("HISTORY_DB", DEFAULT_DB_PATH)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (TX_HASH_INDEX,)).fetchone() is None:
+            conn.executescript(f"BEGIN; {TX_HASH_MIGRATION} COMMIT;")
+
+    def _connect(self):
+        # One connection per thread; Flask serves requests from a thread pool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, entry):
+        """
+        Appends a purchase record (any JSON object) and returns its id, or
+        None if a record with the same tx_hash already exists.
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO purchases (created_at, timestamp, reason, tx_hash, data) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), entry.get("timestamp"), entry.get("reason"), entry.get("tx_hash") or None, json.dumps(entry)),
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, reason=None):
+        """
+        Newest-first page of at most `limit` rows with id < cursor.
+        Returns (items, next_cursor); next_cursor is None on the last page.
+        """
+        limit = _clamp(limit)
+        clauses, params = _filters(reason)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        items = self._select(clauses, params, "id DESC", limit + 1)
+        next_cursor = items[limit - 1]["id"] if len(items) > limit else None
+        return items[:limit], next_cursor
+
+    def since(self, since_id, limit=DEFAULT_PAGE_SIZE, reason=None):
+        """Oldest-first rows with id > since_id, for incremental fetches."""
+        clauses, params = _filters(reason)
+        clauses.append("id > ?")
+        params.append(since_id)
+        return self._select(clauses, params, "id ASC", _clamp(limit))
+
+    def find_by_tx(self, tx_hash):
+        return self._select(["tx_hash = ?"], [tx_hash], "id ASC", MAX_PAGE_SIZE)
+
+    def latest_id(self):
+        row = self._connect().execute("SELECT MAX(id) FROM purchases").fetchone()
+        return row[0] or 0
+
+    def reasons(self):
+        rows = self._connect().execute("SELECT DISTINCT reason FROM purchases WHERE reason IS NOT NULL ORDER BY reason")
+        return [row[0] for row in rows]
+
+    def _select(self, clauses, params, order, limit):
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id, created_at, data FROM purchases {where} ORDER BY {order} LIMIT ?",
+            (*params, limit),
+        )
+        return [{**json.loads(data), "id": row_id, "created_at": created_at} for row_id, created_at, data in rows]
+
+
+def _clamp(limit):
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def _filters(reason):
+    if reason:
+        return ["reason = ?"], [reason]
+    return [], []
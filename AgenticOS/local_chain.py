@@ -0,0 +1,120 @@
+import os
+import shutil
+from collections import Counter
+from functools import lru_cache
+from eth_account import Account
+from web3 import Web3, EthereumTesterProvider
+
+# In-process EVM (eth-tester + py-evm) with contract.sol deployed, for offline
+# benchmarks. Needs `py-solc-x` and `eth-tester[py-evm]`, plus network access to
+# download solc unless SOLC_BINARY (or a solc on PATH) points at a local compiler.
+
+CONTRACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "contract.sol")
+CONTRACT_NAME = "AgenticCommerceOS_Master"
+SOLC_VERSION = os.getenv("SOLC_VERSION", "0.8.24")
+SOLC_BINARY = os.getenv("SOLC_BINARY") or shutil.which("solc")
+
+
+class CountingProvider(EthereumTesterProvider):
+    """EthereumTesterProvider that counts JSON-RPC calls per method."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = Counter()
+
+    def make_request(self, method, params):
+        self.calls[method] += 1
+        return super().make_request(method, params)
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls.clear()
+
+
+@lru_cache(maxsize=None)
+def compile_contract(path=CONTRACT_PATH, name=CONTRACT_NAME):
+    """Compiles a Solidity file with solc and returns (abi, bytecode)."""
+    import solcx
+
+    if SOLC_BINARY:
+        compiler = {"solc_binary": SOLC_BINARY}
+    else:
+        if SOLC_VERSION not in [str(v) for v in solcx.get_installed_solc_versions()]:
+            print(f"⬇️ Installing solc {SOLC_VERSION}...", flush=True)
+            solcx.install_solc(SOLC_VERSION)
+        compiler = {"solc_version": SOLC_VERSION}
+
+    compiled = solcx.compile_files(
+        [os.path.abspath(path)],
+        output_values=["abi", "bin"],
+        optimize=True,
+        **compiler,
+    )
+    for contract_id, output in compiled.items():
+        if contract_id.endswith(f":{name}"):
+            return output["abi"], output["bin"]
+    raise ValueError(f"❌ Contract {name} not found in {path}")
+
+
+class LocalChain:
+    """
+    A fresh in-process chain with the contract deployed, one agent configured,
+    one merchant whitelisted and the vault funded.
+    """
+
+    def __init__(self, source=CONTRACT_PATH, daily_limit_eth=1000, cooldown=0, vault_eth=1000, agent_eth=100):
+        self.provider = CountingProvider()
+        self.w3 = Web3(self.provider)
+        self.owner = self.w3.eth.accounts[0]
+        self.merchant = self.w3.eth.accounts[1]
+        self.agent = Account.create()
+
+        abi, bytecode = compile_contract(source)
+        self.abi = abi
+        factory = self.w3.eth.contract(abi=abi, bytecode=bytecode)
+        receipt = self.transact(factory.constructor())
+        self.contract = self.w3.eth.contract(address=receipt["contractAddress"], abi=abi)
+
+        self.transact(self.contract.functions.configureAgent(
+            self.agent.address, "Bench-Agent", self.w3.to_wei(daily_limit_eth, "ether"), cooldown
+        ))
+        self.transact(self.contract.functions.addMerchant(self.merchant, "Bench-Merchant"))
+        self.fund(self.contract.address, vault_eth)
+        self.fund(self.agent.address, agent_eth)
+        self.provider.reset_calls()
+
+    @property
+    def chain_id(self):
+        return self.w3.eth.chain_id
+
+    def transact(self, function_call, sender=None):
+        """Sends a call from an unlocked tester account and returns its receipt."""
+        tx_hash = function_call.transact({"from": sender or self.owner})
+        return self.w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def fund(self, address, amount_eth):
+        tx_hash = self.w3.eth.send_transaction({
+            "from": self.owner,
+            "to": address,
+            "value": self.w3.to_wei(amount_eth, "ether"),
+        })
+        return self.w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def export_env(self):
+        """Points the env vars read by BlockchainBody at this chain."""
+        os.environ.update({
+            "AGENT_ADDRESS": self.agent.address,
+            "AGENT_PRIVATE_KEY": self.agent.key.hex(),
+            "MERCHANT_ADDRESS": self.merchant,
+            "CONTRACT_ADDRESS": self.contract.address,
+        })
+
+    def body(self, **kwargs):
+        """A BlockchainBody wired to this chain (confirmations polled quickly: blocks are instant here)."""
+        from blockchain_body import BlockchainBody
+
+        self.export_env()
+        kwargs.setdefault("confirm_poll_interval", 0.05)
+        return BlockchainBody(w3=self.w3, **kwargs)
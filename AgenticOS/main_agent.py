@@ -1,63 +1,258 @@
 import time
+import uuid
 import requests
 import os
-from blockchain_body import BlockchainBody
-from agent_brain import get_ai_decision
+from agent_brain import get_ai_decision, parse_defer
+from purchase_journal import (
+    PurchaseJournal, PurchaseError, purchase_key, INTENT, SIGNED, BROADCAST, CONFIRMED, REPORTED, FAILED
+)
+from rate_limiter import AdaptiveInterval, Backoff
+from status_registry import DEFAULT_SYSTEM
+import telemetry
 
-def run():
+API_URL = "http://127.0.0.1:5001"
+
+# Which system this agent pays for when trigger_service monitors several (None = the default one)
+SYSTEM_ID = os.getenv("SYSTEM_ID")
+
+# Long-poll window; the service answers immediately when the status changes
+POLL_TIMEOUT = 30
+
+def parse_decision(decision):
+    """Returns the purchase reason for an ACTION:BUY decision, or None for anything else."""
+    if "ACTION:BUY" not in decision:
+        return None
+    reason = "Scaling server load"
+    if "|" in decision:
+        reason = decision.split("|")[1].replace("REASON:", "").strip()
+    return reason
+
+def status_url(api_url, system_id=None):
+    return f"{api_url}/status/{system_id}" if system_id else f"{api_url}/status"
+
+def register_system(session, api_url, system_id):
+    """Registers the watched system with trigger_service, which answers 404 to reads of unknown systems."""
+    if not system_id:
+        return  # the default system always exists
+    response = session.put(f"{api_url}/systems/{system_id}", timeout=5)
+    if response.status_code not in (404, 405):  # services without registration create systems on read
+        response.raise_for_status()
+
+def wait_for_change(session, since, api_url=API_URL, timeout=POLL_TIMEOUT, system_id=None):
+    """
+    Long-polls trigger_service until the system's status version moves past `since`.
+    Returns (version, status, epoch); the version equals `since` if nothing changed.
+    Returns None if the service has no poll endpoint.
+    """
+    response = session.get(
+        f"{status_url(api_url, system_id)}/poll",
+        params={"since": since, "timeout": timeout},
+        timeout=timeout + 5
+    )
+    if response.status_code == 404:
+        return None
+    data = response.json()
+    return data["version"], data["status"], data.get("epoch")
+
+def poll_status(session, since, api_url, poller, timeout=POLL_TIMEOUT, system_id=None):
+    """
+    Fallback for status services without change streams: polls /status at
+    an interval that follows the status volatility (see AdaptiveInterval).
+    """
+    time.sleep(min(poller.interval, timeout))
+    status = session.get(status_url(api_url, system_id), timeout=5).json()
+    changed = status != poller.last
+    poller.update(status)
+    # Versions are counted locally here, so they only identify events within this run
+    return (since + 1 if changed else since), status, None
+
+def pay_once(body, journal, key, reason, system_id):
+    """
+    Pays for one status event at most once, resuming whatever the journal
+    has under `key`: a confirmed purchase is not paid again, a signed or
+    broadcast one is recovered from the chain, and a failed one is retried
+    only once the chain confirms it never went through.
+    Returns the journal entry once the purchase is confirmed (or already
+    reported), or None if the policy mirror rejected it.
+    Raises PurchaseError if it failed.
+    """
+    entry = journal.begin(key, body.agent_address, reason, system_id)
+    if entry["state"] == FAILED:
+        entry = body.recheck_failed(journal, entry)
+    if entry["state"] in (SIGNED, BROADCAST):
+        print(f"🔁 Recovering journaled purchase for this event ({entry['tx_hash']})...", flush=True)
+        body.recover_purchase(journal, entry)
+        entry = journal.get(key)
+    if entry["state"] == FAILED:
+        entry = journal.retry(key)
+    if entry["state"] != INTENT:
+        return entry
+
+    print(f"💰 Executing Blockchain Payment...", flush=True)
+    if body.execute_purchase(reason, journal=journal, key=key) is None:
+        rejection = getattr(body, "last_rejection", None) or {}
+        journal.advance(key, FAILED, error=rejection.get("error", "rejected"))
+        return None
+    return journal.get(key)
+
+def report_purchase(session, api_url, journal, entry):
+    """Tells trigger_service about a confirmed purchase (it dedupes by tx hash) and journals it as reported."""
+    response = session.post(f"{api_url}/add_history", json={
+        "timestamp": time.strftime("%H:%M:%S"),
+        "reason": entry["reason"],
+        "tx_hash": entry["tx_hash"],
+        "system_id": entry["system_id"]
+    }, timeout=5)
+    response.raise_for_status()
+    journal.advance(entry["key"], REPORTED)
+
+def recover_journal(body, journal):
+    """
+    Startup pass over purchases a previous run left open: signed ones are
+    resolved against the chain (and re-sent while still pending), intents
+    that never got signed are closed. Confirmed ones are reported by the loop.
+    """
+    for entry in journal.open_entries(body.agent_address):
+        if entry["state"] == INTENT:
+            journal.advance(entry["key"], FAILED, error="abandoned before signing")
+        elif entry["state"] in (SIGNED, BROADCAST):
+            print(f"🔁 Recovering in-flight purchase {entry['tx_hash']}...", flush=True)
+            try:
+                body.recover_purchase(journal, entry)
+            except PurchaseError as e:
+                print(f"⚠️ Recovery failed: {e}", flush=True)
+
+def run(api_url=API_URL, body=None, decide=get_ai_decision, max_purchases=None, system_id=SYSTEM_ID, journal=None):
+    """
+    Watch → decide → pay loop. The keyword arguments let benchmarks and
+    tests drive the same loop against a local chain and a stub brain.
+    Purchases go through a PurchaseJournal, so a restarted agent finishes
+    what it had in flight instead of paying again.
+    """
     print("🚀 Agentic OS is online and watching...", flush=True)
+    telemetry.start_metrics_server()
     
     try:
-        body = BlockchainBody()
+        if body is None:
+            # web3 is the slowest import; loading it here lets the loop's imports stay light
+            from blockchain_body import BlockchainBody
+            body = BlockchainBody()
         print("🔗 Blockchain Body Connected Successfully.", flush=True)
     except Exception as e:
         print(f"❌ Blockchain Connection Failed: {e}", flush=True)
         return
 
-    while True:
+    journal = journal or PurchaseJournal()
+    recover_journal(body, journal)
+
+    # One keep-alive connection to the status service for the whole run
+    session = requests.Session()
+    # Latest status version seen, and its status; versions are only unique within a service epoch
+    version = 0
+    status = None
+    epoch = None
+    local_epoch = f"local-{uuid.uuid4().hex[:12]}"
+    # When set, the current status is re-evaluated at this time even without a change
+    # (LLM quota deferral or a failed purchase)
+    retry_at = None
+    backoff = Backoff(base=1, cap=60)
+    poller = None  # only used when the service cannot push changes
+    purchases = 0
+    registered = False
+
+    while max_purchases is None or purchases < max_purchases:
         try:
-            # 1. Fetch current system status
-            response = requests.get("http://127.0.0.1:5001/status", timeout=5)
-            status = response.json()
-            print(f"📊 Current Load: {status.get('load')}%", flush=True)
+            if not registered:
+                register_system(session, api_url, system_id)
+                registered = True
+
+            # 0. Report confirmed purchases a crash or a failed POST left unreported
+            for entry in journal.open_entries(body.agent_address):
+                if entry["state"] == CONFIRMED:
+                    with telemetry.span("report"):
+                        report_purchase(session, api_url, journal, entry)
+                    print(f"🔄 Reported earlier purchase {entry['tx_hash']}.", flush=True)
+
+            # 1. Block until the system status changes (or a scheduled retry is due)
+            timeout = POLL_TIMEOUT if retry_at is None else max(0.0, retry_at - time.monotonic())
+            with telemetry.span("status_wait"):
+                change = None if poller else wait_for_change(session, version, api_url, timeout, system_id)
+                if change is None:
+                    if poller is None:
+                        print("ℹ️ Status service has no change stream; polling adaptively.", flush=True)
+                        poller = AdaptiveInterval()
+                    change = poll_status(session, version, api_url, poller, timeout, system_id)
+            new_version, new_status, new_epoch = change
+            if new_version != version or new_epoch != epoch:
+                version, status, epoch, retry_at = new_version, new_status, new_epoch, None
+            elif retry_at is None or time.monotonic() < retry_at:
+                continue
+
+            # One trace per evaluation: decide → purchase → report
+            with telemetry.span("cycle", version=version):
+                print(f"📊 Current Load: {status.get('load')}% (v{version})", flush=True)
+
+                # 2. Ask Gemini (The Brain) for a decision
+                with telemetry.span("decide"):
+                    decision = decide(status)
 
-            # 2. Ask Gemini (The Brain) for a decision
-            decision = get_ai_decision(status)
+                retry_in = parse_defer(decision)
+                if retry_in is not None:
+                    # Quota is busy: keep watching, come back to this status when the LLM has room
+                    print(f"⏳ LLM quota busy. Re-evaluating in {retry_in:.1f}s...", flush=True)
+                    retry_at = time.monotonic() + retry_in
+                    continue
+
+                reason = parse_decision(decision)
+                telemetry.count("agent_decisions_by_action_total", action="buy" if reason is not None else "wait")
             
-            # CHECK: If Gemini hit a rate limit (429), it returns "ACTION:WAIT" 
-            # and we should slow down our loop.
-            if "ACTION:BUY" in decision:
-                reason = "Scaling server load"
-                if "|" in decision:
-                    reason = decision.split("|")[1].replace("REASON:", "").strip()
-                
-                print(f"🧠 AI DECISION: {decision}", flush=True)
-                print(f"💰 Executing Blockchain Payment...", flush=True)
-
-                # 3. Perform the transaction
-                tx_hash = body.execute_purchase(reason)
-                print(f"✅ TRANSACTION SUCCESS: {tx_hash}", flush=True)
-
-                # 4. Notify server to Log & Revert
-                requests.post("http://127.0.0.1:5001/add_history", json={
-                    "timestamp": time.strftime("%H:%M:%S"),
-                    "reason": reason,
-                    "tx_hash": tx_hash
-                })
-                print("🔄 Revert Signal Sent. System load reset.")
-                
-                # After a purchase, wait a bit longer to let the blockchain settle
-                time.sleep(15) 
+                if reason is not None:
+                    print(f"🧠 AI DECISION: {decision}", flush=True)
+
+                    # 3. Perform the transaction, at most once per status event
+                    key = purchase_key(body.agent_address, system_id or DEFAULT_SYSTEM, epoch or local_epoch, version)
+                    with telemetry.span("purchase", reason=reason):
+                        try:
+                            entry = pay_once(body, journal, key, reason, system_id or DEFAULT_SYSTEM)
+                        except PurchaseError as e:
+                            print(f"❌ Payment failed: {e}", flush=True)
+                            entry = None
+                    if entry is not None and entry["state"] == REPORTED:
+                        # Paid and reported before a restart; the revert is on its way
+                        telemetry.count("agent_purchases_total", result="duplicate")
+                        print(f"🔁 Already paid for this event ({entry['tx_hash']}). Waiting for changes...", flush=True)
+                        retry_at = None
+                        continue
+                    telemetry.count("agent_purchases_total", result="success" if entry else "failed")
+                    if entry is None:
+                        rejection = getattr(body, "last_rejection", None)
+                        if rejection and rejection["retry_in"] is not None:
+                            # Blocked locally by cooldown/budget: come back exactly when the contract allows it
+                            delay = rejection["retry_in"] + 1
+                            print(f"⏳ {rejection['error']}. Retrying in {delay:.0f}s...", flush=True)
+                        else:
+                            delay = backoff.next()
+                            print(f"⚠️ Payment failed. Retrying in {delay:.1f}s...", flush=True)
+                        retry_at = time.monotonic() + delay
+                        continue
+                    backoff.reset()
+                    print(f"✅ TRANSACTION SUCCESS: {entry['tx_hash']}", flush=True)
+
+                    # 4. Notify server to Log & Revert (the revert arrives as the next change event)
+                    with telemetry.span("report"):
+                        report_purchase(session, api_url, journal, entry)
+                    print("🔄 Revert Signal Sent. System load reset.")
+                    purchases += 1
             
-            else:
-                print("🟢 System Stable. Waiting 10s...", flush=True)
+                else:
+                    print("🟢 System Stable. Waiting for changes...", flush=True)
 
-        except Exception as e:
-            print(f"⚠️ Runtime Error: {e}", flush=True)
+            retry_at = None
 
-        # MANDATORY COOLDOWN: Prevents 429 Resource Exhausted errors
-        # 10 seconds means max 6 requests per minute (well within 15 RPM limit)
-        time.sleep(10)
+        except Exception as e:
+            delay = backoff.next()
+            print(f"⚠️ Runtime Error: {e}. Retrying in {delay:.1f}s...", flush=True)
+            time.sleep(delay)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -0,0 +1,213 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+/**
+ * @title AgenticCommerceOS_Master
+ * @notice Final professional-grade restricted payment rail for AI Agents.
+ * @dev Candidate packed storage layout (AgentPolicy in two slots). Not deployed:
+ *      contract.sol keeps the current layout until bench_gas.py has measured this one.
+ */
+contract AgenticCommerceOS_Master {
+    error NotOwner();
+    error SystemPaused();
+    error AgentDisabled();
+    error MerchantNotWhitelisted();
+    error InsufficientContractBalance(uint256 available, uint256 required);
+    error CooldownActive(uint256 nextAllowedTimestamp);
+    error DailyBudgetExceeded(uint256 remainingBudget);
+    error TransferFailed();
+    error EmptyBatch();
+    error ValueOutOfRange();
+
+    address public immutable owner;
+    // Packed with the pause flag: the guard's slot is already warm when isPaused is read
+    bool public isPaused;
+    uint8 private _status;
+    uint8 private constant _NOT_ENTERED = 1;
+    uint8 private constant _ENTERED = 2;
+
+    /**
+     * @dev Two slots per agent. The first holds the owner's settings and is only
+     *      read by purchases; the second is the spend state, the one slot a purchase
+     *      writes. The agent's name lives in the AgentConfigured event only.
+     */
+    struct AgentPolicy {
+        uint128 dailyLimit;
+        uint64 cooldownPeriod;
+        bool isActive;
+        uint128 totalSpentToday;
+        uint64 lastResetTime;
+        uint64 lastTxTimestamp;
+    }
+
+    struct PurchaseItem {
+        address payable merchant;
+        uint256 amount;
+        string purpose;
+    }
+
+    struct AgentConfig {
+        address agent;
+        string name;
+        uint256 dailyLimit;
+        uint256 cooldown;
+    }
+
+    struct MerchantConfig {
+        address merchant;
+        string label;
+    }
+
+    mapping(address => AgentPolicy) public agents;
+    mapping(address => bool) public whitelistedMerchants;
+    // Kept out of AgentPolicy so purchases never touch it; only configureAgent writes it
+    mapping(address => string) public agentNames;
+
+    // Events for Auditability & Website Frontend
+    event AgentConfigured(address indexed agent, string name, uint256 limit);
+    event MerchantAuthorized(address indexed merchant, string label);
+    event PurchaseReceipt(address indexed agent, address indexed merchant, uint256 amount, string purpose);
+    event SystemStatus(string message, bool paused);
+
+    constructor() {
+        owner = msg.sender;
+        _status = _NOT_ENTERED;
+    }
+
+    modifier onlyOwner() {
+        if (msg.sender != owner) revert NotOwner();
+        _;
+    }
+
+    modifier nonReentrant() {
+        if (_status == _ENTERED) revert("ReentrancyGuard: reentrant call");
+        _status = _ENTERED;
+        _;
+        _status = _NOT_ENTERED;
+    }
+
+    // --- Governance Actions (Human Owner) ---
+
+    function configureAgent(address _agent, string calldata _name, uint256 _dailyLimit, uint256 _cooldown) external onlyOwner {
+        _configureAgent(_agent, _name, _dailyLimit, _cooldown);
+    }
+
+    /// @notice Bulk version of configureAgent for fleet provisioning; one event per agent.
+    function configureAgents(AgentConfig[] calldata _configs) external onlyOwner {
+        for (uint256 i = 0; i < _configs.length; i++) {
+            AgentConfig calldata config = _configs[i];
+            _configureAgent(config.agent, config.name, config.dailyLimit, config.cooldown);
+        }
+    }
+
+    function addMerchant(address _merchant, string calldata _label) external onlyOwner {
+        whitelistedMerchants[_merchant] = true;
+        emit MerchantAuthorized(_merchant, _label);
+    }
+
+    /// @notice Bulk version of addMerchant; one event per merchant.
+    function addMerchants(MerchantConfig[] calldata _merchants) external onlyOwner {
+        for (uint256 i = 0; i < _merchants.length; i++) {
+            whitelistedMerchants[_merchants[i].merchant] = true;
+            emit MerchantAuthorized(_merchants[i].merchant, _merchants[i].label);
+        }
+    }
+
+    function togglePause() external onlyOwner {
+        isPaused = !isPaused;
+        string memory statusMsg = isPaused ? "System Paused" : "System Active";
+        emit SystemStatus(statusMsg, isPaused);
+    }
+
+    function _configureAgent(address _agent, string calldata _name, uint256 _dailyLimit, uint256 _cooldown) private {
+        if (_dailyLimit > type(uint128).max || _cooldown > type(uint64).max) revert ValueOutOfRange();
+        agents[_agent] = AgentPolicy({
+            dailyLimit: uint128(_dailyLimit),
+            cooldownPeriod: uint64(_cooldown),
+            isActive: true,
+            totalSpentToday: 0,
+            lastResetTime: uint64(block.timestamp),
+            lastTxTimestamp: 0
+        });
+        agentNames[_agent] = _name;
+        emit AgentConfigured(_agent, _name, _dailyLimit);
+    }
+
+    // --- AI Agent Actions ---
+
+    function executePurchase(address payable _merchant, uint256 _amount, string calldata _purpose) external nonReentrant {
+        if (isPaused) revert SystemPaused();
+        AgentPolicy storage policy = agents[msg.sender];
+
+        if (!policy.isActive) revert AgentDisabled();
+        if (!whitelistedMerchants[_merchant]) revert MerchantNotWhitelisted();
+        _chargePolicy(policy, _amount);
+
+        (bool success, ) = _merchant.call{value: _amount}("");
+        if (!success) revert TransferFailed();
+
+        emit PurchaseReceipt(msg.sender, _merchant, _amount, _purpose);
+    }
+
+    /**
+     * @notice Runs several purchases under one reentrancy guard and one policy/budget check.
+     * @dev The whole batch reverts if any item fails; one PurchaseReceipt is emitted per item.
+     */
+    function batchExecutePurchase(PurchaseItem[] calldata _items) external nonReentrant {
+        if (isPaused) revert SystemPaused();
+        if (_items.length == 0) revert EmptyBatch();
+        AgentPolicy storage policy = agents[msg.sender];
+
+        if (!policy.isActive) revert AgentDisabled();
+
+        uint256 total;
+        for (uint256 i = 0; i < _items.length; i++) {
+            if (!whitelistedMerchants[_items[i].merchant]) revert MerchantNotWhitelisted();
+            total += _items[i].amount;
+        }
+        _chargePolicy(policy, total);
+
+        for (uint256 i = 0; i < _items.length; i++) {
+            PurchaseItem calldata item = _items[i];
+            (bool success, ) = item.merchant.call{value: item.amount}("");
+            if (!success) revert TransferFailed();
+
+            emit PurchaseReceipt(msg.sender, item.merchant, item.amount, item.purpose);
+        }
+    }
+
+    /**
+     * @dev Balance, cooldown and daily budget checks shared by the single and batch paths.
+     *      Works on locals and writes the spend slot back once at the end.
+     */
+    function _chargePolicy(AgentPolicy storage policy, uint256 _amount) private {
+        if (address(this).balance < _amount) revert InsufficientContractBalance(address(this).balance, _amount);
+        uint256 nextAllowed = uint256(policy.lastTxTimestamp) + policy.cooldownPeriod;
+        if (block.timestamp < nextAllowed) revert CooldownActive(nextAllowed);
+
+        uint256 spent = policy.totalSpentToday;
+        uint64 lastReset = policy.lastResetTime;
+
+        // Reset budget every 24 hours
+        if (block.timestamp >= uint256(lastReset) + 1 days) {
+            spent = 0;
+            lastReset = uint64(block.timestamp);
+        }
+
+        uint256 limit = policy.dailyLimit;
+        if (spent + _amount > limit) revert DailyBudgetExceeded(limit - spent);
+
+        // spent + _amount <= dailyLimit, so it fits in uint128
+        policy.totalSpentToday = uint128(spent + _amount);
+        policy.lastResetTime = lastReset;
+        policy.lastTxTimestamp = uint64(block.timestamp);
+    }
+
+    function getAgentInfo(address _agent) external view returns (string memory name, uint256 remainingBudget, uint256 nextAllowedTxTime, bool active) {
+        AgentPolicy memory p = agents[_agent];
+        uint256 budgetUsed = (block.timestamp >= uint256(p.lastResetTime) + 1 days) ? 0 : p.totalSpentToday;
+        return (agentNames[_agent], p.dailyLimit - budgetUsed, uint256(p.lastTxTimestamp) + p.cooldownPeriod, p.isActive);
+    }
+
+    receive() external payable {}
+}
@@ -0,0 +1,262 @@
+import threading
+import time
+from web3 import Web3
+from rpc_transport import batch_call, uncached
+
+DAY = 24 * 60 * 60
+
+MIRRORED_EVENTS = ("PurchaseReceipt", "AgentConfigured", "MerchantAuthorized", "SystemStatus")
+
+
+def parse_policy(agents_result):
+    """The agents(address) getter's tuple as a dict, in the contract's field order."""
+    name, daily_limit, spent_today, last_reset, cooldown, last_tx, active = agents_result
+    return {
+        "name": name,
+        "daily_limit": daily_limit,
+        "spent_today": spent_today,
+        "last_reset": last_reset,
+        "cooldown": cooldown,
+        "last_tx": last_tx,
+        "active": active,
+    }
+
+
+def check_spend(policy, amount, now):
+    """
+    The contract's cooldown and daily budget rules (_chargePolicy) for a
+    policy dict at chain time `now`: None if `amount` may be spent,
+    otherwise the rejection the contract would revert with.
+    """
+    next_allowed = policy["last_tx"] + policy["cooldown"]
+    if now < next_allowed:
+        return _rejection("CooldownActive", f"Cooldown until {next_allowed}", next_allowed, now)
+
+    spent = 0 if now >= policy["last_reset"] + DAY else policy["spent_today"]
+    if spent + amount > policy["daily_limit"]:
+        remaining = policy["daily_limit"] - spent
+        if amount > policy["daily_limit"]:
+            return _rejection("DailyBudgetExceeded", f"{amount} wei exceeds the daily limit")
+        reset_at = policy["last_reset"] + DAY
+        return _rejection(
+            "DailyBudgetExceeded", f"{remaining} wei left until the budget resets at {reset_at}", reset_at, now
+        )
+    return None
+
+
+def apply_spend(policy, amount, now):
+    """Updates a policy dict the way a successful purchase at chain time `now` does."""
+    if now >= policy["last_reset"] + DAY:
+        policy["spent_today"] = 0
+        policy["last_reset"] = now
+    policy["spent_today"] += amount
+    policy["last_tx"] = now
+
+
+def _hex(value):
+    if isinstance(value, str):
+        return Web3.to_hex(hexstr=value)
+    return Web3.to_hex(value)
+
+
+class PolicyMirror:
+    """
+    Client-side copy of everything executePurchase checks for one agent:
+    the pause flag, the agent's AgentPolicy, the merchant whitelist and the
+    vault balance. It is loaded in one JSON-RPC batch, then kept current
+    from our own sends and from the contract's events, so a purchase that
+    would revert is rejected (or deferred to its next allowed time) before
+    anything is signed or sent.
+
+    The contract stays authoritative: the mirror is fully reloaded every
+    max_age seconds, after any failed or reverted send, and before it
+    rejects a purchase for a reason it cannot see change (vault deposits
+    emit no event).
+    """
+
+    def __init__(self, w3, contract, agent_address, event_interval=12, max_age=300):
+        self.w3 = w3
+        self.contract = contract
+        self.agent_address = Web3.to_checksum_address(agent_address)
+        self.event_interval = event_interval
+        self.max_age = max_age
+
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._polled_at = 0
+        self._block = None
+        self._chain_time = 0
+        self._own_txs = set()  # purchases already applied locally, skipped when their event arrives
+        self._topics = {
+            _hex(contract.events[name]().topic): contract.events[name]() for name in MIRRORED_EVENTS
+        }
+
+        self.paused = False
+        self.policy = None
+        self.whitelist = {}
+        self.vault_balance = 0
+
+    # --- Loading ---
+
+    def load(self, merchants=()):
+        """
+        Reloads pause flag, policy, vault balance and the given merchants'
+        whitelist entries. The reads bypass the RPC cache: a reload follows a
+        confirmed or failed send, so block-scoped cached answers are stale.
+        """
+        merchants = [Web3.to_checksum_address(m) for m in merchants] or list(self.whitelist)
+        with uncached(self.w3):
+            results = batch_call(self.w3, [
+                self.contract.functions.isPaused(),
+                self.contract.functions.agents(self.agent_address),
+                lambda: self.w3.eth.get_balance(self.contract.address),
+                lambda: self.w3.eth.get_block("latest"),
+            ] + [self.contract.functions.whitelistedMerchants(m) for m in merchants])
+        paused, policy, vault_balance, latest = results[:4]
+        with self._lock:
+            self.seed(paused, policy, vault_balance, latest["number"], latest["timestamp"])
+            self.whitelist.update(zip(merchants, results[4:]))
+        return self.snapshot()
+
+    def seed(self, paused, policy, vault_balance, block_number, block_timestamp):
+        """Adopts state read elsewhere (e.g. in BlockchainBody.preflight). `policy` is the agents() tuple."""
+        with self._lock:
+            self.paused = paused
+            self.policy = parse_policy(policy)
+            self.vault_balance = vault_balance
+            self._block = block_number
+            self._chain_time = max(self._chain_time, block_timestamp)
+            self._own_txs.clear()
+            self._loaded_at = self._polled_at = time.monotonic()
+
+    def seed_merchant(self, merchant, whitelisted):
+        with self._lock:
+            self.whitelist[Web3.to_checksum_address(merchant)] = whitelisted
+
+    def invalidate(self):
+        """Forces a full reload before the next check."""
+        with self._lock:
+            self._loaded_at = None
+
+    def refresh(self, merchants=()):
+        """
+        Reloads if stale, otherwise applies contract events newer than the
+        last seen block. Returns True if the state was reloaded from the chain.
+        """
+        with self._lock:
+            missing = [m for m in merchants if Web3.to_checksum_address(m) not in self.whitelist]
+            if not missing and self._loaded_at is not None:
+                if time.monotonic() - self._loaded_at > self.max_age:
+                    self.invalidate()
+                elif time.monotonic() - self._polled_at > self.event_interval:
+                    self.poll_events()
+            if missing or self._loaded_at is None:
+                self.load(list(self.whitelist) + missing)
+                return True
+            return False
+
+    def poll_events(self):
+        """Applies PurchaseReceipt / AgentConfigured / MerchantAuthorized / SystemStatus logs since the last block."""
+        with self._lock:
+            head = self.w3.eth.block_number
+            if head > self._block:
+                logs = self.w3.eth.get_logs({
+                    "address": self.contract.address,
+                    "fromBlock": self._block + 1,
+                    "toBlock": head,
+                    "topics": [list(self._topics)],
+                })
+                for log in logs:
+                    event = self._topics[_hex(log["topics"][0])].process_log(log)
+                    self.apply_event(event["event"], event["args"], _hex(event["transactionHash"]))
+                    if self._loaded_at is None:
+                        break  # the event needs a full reload anyway
+                self._block = head
+            self._polled_at = time.monotonic()
+
+    def apply_event(self, name, args, tx_hash=None):
+        with self._lock:
+            if name == "SystemStatus":
+                self.paused = args["paused"]
+            elif name == "MerchantAuthorized":
+                self.whitelist[Web3.to_checksum_address(args["merchant"])] = True
+            elif name == "AgentConfigured":
+                if Web3.to_checksum_address(args["agent"]) == self.agent_address:
+                    self.invalidate()  # the event does not carry the new cooldown
+            elif name == "PurchaseReceipt":
+                if tx_hash in self._own_txs:
+                    return
+                self.vault_balance -= args["amount"]
+                if Web3.to_checksum_address(args["agent"]) == self.agent_address:
+                    # One of our purchases sent from elsewhere; the block time is unknown here
+                    self.invalidate()
+
+    # --- Own sends ---
+
+    def note_sent(self, tx_hash, amount):
+        """Applies a broadcast purchase (or batch total) the way the contract will when it is mined."""
+        with self._lock:
+            if self.policy is None:
+                return
+            apply_spend(self.policy, amount, self.chain_now())
+            self.vault_balance -= amount
+            self._own_txs.add(_hex(tx_hash))
+
+    # --- Checks ---
+
+    def chain_now(self):
+        """Best guess of the next block's timestamp: wall clock, never behind the last block seen."""
+        return max(int(time.time()), self._chain_time)
+
+    def check(self, amount, merchants):
+        """
+        Mirrors executePurchase / batchExecutePurchase. Returns None if the
+        purchase should go through, or a dict with the custom error the
+        contract would revert with, a detail message and, when waiting
+        helps, the chain timestamp it becomes allowed at (`retry_at`) and
+        the seconds until then (`retry_in`).
+        """
+        merchants = [Web3.to_checksum_address(m) for m in merchants]
+        reloaded = self.refresh(merchants)
+        rejection = self._check(amount, merchants)
+        if rejection is not None and rejection["error"] == "InsufficientContractBalance" and not reloaded:
+            # Deposits are invisible to the mirror; confirm against the chain before giving up
+            self.load(merchants)
+            rejection = self._check(amount, merchants)
+        return rejection
+
+    def _check(self, amount, merchants):
+        with self._lock:
+            policy = self.policy
+            now = self.chain_now()
+            if self.paused:
+                return _rejection("SystemPaused", "System is paused")
+            if not policy["active"]:
+                return _rejection("AgentDisabled", f"Agent {self.agent_address} is not active")
+            for merchant in merchants:
+                if not self.whitelist.get(merchant):
+                    return _rejection("MerchantNotWhitelisted", f"Merchant {merchant} is not whitelisted")
+            if self.vault_balance < amount:
+                return _rejection(
+                    "InsufficientContractBalance", f"Vault holds {self.vault_balance} wei, purchase needs {amount}"
+                )
+            return check_spend(policy, amount, now)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "paused": self.paused,
+                "policy": dict(self.policy) if self.policy else None,
+                "whitelist": dict(self.whitelist),
+                "vault_balance": self.vault_balance,
+                "block": self._block,
+            }
+
+
+def _rejection(error, detail, retry_at=None, now=None):
+    return {
+        "error": error,
+        "detail": detail,
+        "retry_at": retry_at,
+        "retry_in": None if retry_at is None else max(0, retry_at - now),
+    }
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal.db")
+
+# Purchase lifecycle, in order. A purchase only moves forward, except that a
+# FAILED one may be retried under the same key (no payment went through).
+INTENT = "intent"        # decided to buy; nothing signed yet
+SIGNED = "signed"        # raw tx and its hash written down, maybe broadcast
+BROADCAST = "broadcast"  # accepted by the node
+CONFIRMED = "confirmed"  # mined successfully; the purchase happened
+REPORTED = "reported"    # trigger_service has it in its history
+FAILED = "failed"        # rejected, reverted or dropped
+
+OPEN_STATES = (INTENT, SIGNED, BROADCAST, CONFIRMED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intents (
+    key TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    state TEXT NOT NULL,
+    reason TEXT,
+    system_id TEXT,
+    nonce INTEGER,
+    tx_hash TEXT,
+    tx_hashes TEXT NOT NULL DEFAULT '[]',
+    raw_tx TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_intents_open ON intents(agent, state);
+"""
+
+
+class PurchaseError(Exception):
+    """A purchase that was attempted and did not go through; tx_hash is set once it was signed."""
+
+    def __init__(self, message, tx_hash=None):
+        super().__init__(message)
+        self.tx_hash = tx_hash
+
+
+def purchase_key(agent, system_id, epoch, version):
+    """Idempotency key of the status event a purchase answers: at most one purchase per key."""
+    return f"{agent}:{system_id}:{epoch}:{version}"
+
+
+class PurchaseJournal:
+    """
+    Write-ahead journal of purchases in SQLite. Each purchase is keyed by
+    the status event that triggered it and every step is committed before
+    the next one starts: the signed raw tx is on disk before it is
+    broadcast, so after a crash the agent can find out what happened to
+    it (or send the very same bytes again) instead of buying twice.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("PURCHASE_JOURNAL_DB", DEFAULT_JOURNAL_PATH)
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: a step must survive a power loss, not just a process crash
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def begin(self, key, agent, reason, system_id):
+        """Records the intent to buy for `key` unless it exists; returns the entry either way."""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO intents (key, agent, state, reason, system_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, agent, INTENT, reason, system_id, now, now),
+            )
+        return self.get(key)
+
+    def advance(self, key, state, **fields):
+        """Moves an entry to `state`, updating any of nonce, tx_hash, raw_tx and error."""
+        columns = {"state": state, "updated_at": time.time(), **fields}
+        if "tx_hash" in fields:
+            # Every hash the purchase went out under (fee bumps change it); recovery checks them all
+            hashes = self.get(key)["tx_hashes"]
+            if fields["tx_hash"] not in hashes:
+                columns["tx_hashes"] = json.dumps(hashes + [fields["tx_hash"]])
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        conn = self._connect()
+        with conn:
+            conn.execute(f"UPDATE intents SET {assignments} WHERE key = ?", (*columns.values(), key))
+
+    def retry(self, key):
+        """Re-opens a FAILED entry for another attempt under the same key."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE intents SET state = ?, nonce = NULL, tx_hash = NULL, tx_hashes = '[]', raw_tx = NULL, "
+                "error = NULL, attempts = attempts + 1, updated_at = ? WHERE key = ? AND state = ?",
+                (INTENT, time.time(), key, FAILED),
+            )
+        return self.get(key)
+
+    def get(self, key):
+        entries = self._select("key = ?", (key,))
+        return entries[0] if entries else None
+
+    def open_entries(self, agent):
+        """The agent's purchases that were not finished, oldest first."""
+        placeholders = ", ".join("?" for _ in OPEN_STATES)
+        return self._select(f"agent = ? AND state IN ({placeholders})", (agent, *OPEN_STATES))
+
+    def _select(self, where, params):
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"SELECT * FROM intents WHERE {where} ORDER BY created_at ASC", params).fetchall()
+        return [{**dict(row), "tx_hashes": json.loads(row["tx_hashes"])} for row in rows]
@@ -0,0 +1,168 @@
+import random
+import re
+import threading
+import time
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` tokens per minute up to `capacity` (default: one minute's worth)."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, amount, now):
+        self._refill(now)
+        return self.tokens >= amount
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class Backoff:
+    """Exponential backoff with equal jitter: half the delay is fixed, half is random."""
+
+    def __init__(self, base=1.0, cap=60.0):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next(self):
+        delay = min(self.cap, self.base * 2 ** self.attempt)
+        self.attempt += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class QuotaLimiter:
+    """
+    Client-side view of a model quota: a requests-per-minute bucket, an
+    optional tokens-per-minute bucket, and a cool-down set by 429 responses
+    (their retry-after hint, or jittered backoff when there is none).
+    Nothing here sleeps; callers ask how long to wait and schedule around it.
+    """
+
+    def __init__(self, rpm, tpm=None, backoff=None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.backoff = backoff or Backoff()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=0):
+        """Takes one request (and `tokens` tokens) if the quota allows it right now."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return False
+            if not self.requests.available(1, now):
+                return False
+            if self.tokens is not None and not self.tokens.available(tokens, now):
+                return False
+            self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            return True
+
+    def wait_time(self, tokens=0):
+        """Seconds until try_acquire(tokens) can succeed."""
+        with self._lock:
+            now = time.monotonic()
+            waits = [self.blocked_until - now, self.requests.wait_time(1, now)]
+            if self.tokens is not None:
+                waits.append(self.tokens.wait_time(tokens, now))
+            return max(0.0, *waits)
+
+    def on_success(self):
+        with self._lock:
+            self.backoff.reset()
+
+    def on_rate_limited(self, retry_after=None):
+        """Records a 429; returns the cool-down applied in seconds."""
+        with self._lock:
+            delay = retry_after if retry_after is not None else self.backoff.next()
+            # A little jitter so a fleet sharing one key does not retry in lockstep
+            delay += random.uniform(0, min(1.0, delay * 0.1))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            # The server says the bucket is empty; don't spend what we think we have
+            self.requests.tokens = min(self.requests.tokens, 0)
+            return delay
+
+
+_RETRY_PATTERNS = (
+    re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"retry[- ]after['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE),
+)
+
+
+def parse_retry_after(error):
+    """Extracts a retry-after hint (seconds) from an API error, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    message = str(error)
+    for pattern in _RETRY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class AdaptiveInterval:
+    """
+    Polling interval driven by status volatility: it drops to min_interval
+    while load is climbing or near the buy threshold, and stretches towards
+    max_interval while the status sits still.
+    """
+
+    def __init__(self, min_interval=0.5, max_interval=30.0, hot_load=70, growth=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hot_load = hot_load
+        self.growth = growth
+        self.interval = min_interval
+        self._last = None
+
+    @property
+    def last(self):
+        """The status passed to the previous update()."""
+        return self._last
+
+    def update(self, status):
+        load = status.get("load") if isinstance(status, dict) else None
+        last, self._last = self._last, status
+        climbing = (
+            isinstance(load, (int, float))
+            and isinstance(last, dict)
+            and isinstance(last.get("load"), (int, float))
+            and load > last["load"]
+        )
+        hot = isinstance(load, (int, float)) and load >= self.hot_load
+        if climbing or hot:
+            self.interval = self.min_interval
+        elif status != last:
+            self.interval = max(self.min_interval, self.interval / self.growth)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.growth)
+        return self.interval
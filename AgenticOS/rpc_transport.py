@@ -0,0 +1,180 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.exceptions import Web3TypeError
+
+# Average block time of the target chain; block-scoped reads live this long
+BLOCK_TIME = float(os.getenv("RPC_BLOCK_TIME", "12"))
+
+# Read-through cache TTLs in seconds (None = for the lifetime of the connection)
+METHOD_TTLS = {
+    "eth_chainId": None,
+    "net_version": None,
+    "web3_clientVersion": 60,
+    "eth_blockNumber": 1,
+    "eth_gasPrice": BLOCK_TIME,
+    "eth_maxPriorityFeePerGas": BLOCK_TIME,
+    "eth_feeHistory": BLOCK_TIME,
+    "eth_getBlockByNumber": 1,
+    "eth_getBalance": BLOCK_TIME,
+    "eth_call": BLOCK_TIME,
+    "eth_estimateGas": BLOCK_TIME,
+}
+
+# A block fetched by number changes when it is reorganised away, so only the moving tags are cached
+TAG_ONLY_METHODS = {"eth_getBlockByNumber"}
+CACHED_TAGS = ("latest", "pending")
+
+# Calls that change chain state; they invalidate every block-scoped entry
+WRITE_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+
+class CachingHTTPProvider(Web3.HTTPProvider):
+    """
+    HTTPProvider over a pooled keep-alive session with a per-method TTL
+    read-through cache. Batches only send the entries that are not cached.
+    Inside uncached(), reads on that thread go to the node and refresh the cache.
+    """
+
+    def __init__(self, endpoint_uri, pool_size=32, method_ttls=None, **kwargs):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        super().__init__(endpoint_uri, session=session, **kwargs)
+        self.method_ttls = METHOD_TTLS if method_ttls is None else method_ttls
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._bypass = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_key(self, method, params):
+        if method not in self.method_ttls:
+            return None
+        if method in TAG_ONLY_METHODS and (not params or params[0] not in CACHED_TAGS):
+            return None
+        return method + json.dumps(params, sort_keys=True, default=str)
+
+    def _cached(self, key):
+        if getattr(self._bypass, "active", False):
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._cache[key]
+                return None
+            self.hits += 1
+            return response
+
+    def _store(self, method, key, response):
+        if "error" in response:
+            return
+        ttl = self.method_ttls[method]
+        with self._cache_lock:
+            self._cache[key] = (response, None if ttl is None else time.monotonic() + ttl)
+
+    @contextlib.contextmanager
+    def uncached(self):
+        previous = getattr(self._bypass, "active", False)
+        self._bypass.active = True
+        try:
+            yield
+        finally:
+            self._bypass.active = previous
+
+    def clear_cache(self, keep_permanent=True):
+        with self._cache_lock:
+            if keep_permanent:
+                self._cache = {k: v for k, v in self._cache.items() if v[1] is None}
+            else:
+                self._cache.clear()
+
+    def make_request(self, method, params):
+        if method in WRITE_METHODS:
+            self.clear_cache()
+        key = self._cache_key(method, params)
+        if key is not None:
+            response = self._cached(key)
+            if response is not None:
+                return response
+        self.misses += 1
+        response = super().make_request(method, params)
+        if key is not None:
+            self._store(method, key, response)
+        return response
+
+    def make_batch_request(self, batch_requests):
+        if any(method in WRITE_METHODS for method, _ in batch_requests):
+            self.clear_cache()
+
+        responses = [None] * len(batch_requests)
+        keys = [self._cache_key(method, params) for method, params in batch_requests]
+        missing = []
+        for i, key in enumerate(keys):
+            responses[i] = self._cached(key) if key is not None else None
+            if responses[i] is None:
+                missing.append(i)
+        if not missing:
+            return responses
+
+        self.misses += len(missing)
+        fetched = super().make_batch_request([batch_requests[i] for i in missing])
+        if not isinstance(fetched, list):
+            return fetched  # single error object for the whole batch
+        for i, response in zip(missing, fetched):
+            responses[i] = response
+            if keys[i] is not None:
+                self._store(batch_requests[i][0], keys[i], response)
+        return responses
+
+    def stats(self):
+        with self._cache_lock:
+            size = len(self._cache)
+        return {"hits": self.hits, "misses": self.misses, "cached": size}
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_web3(rpc_url=None):
+    """Shared Web3 instance (one pooled, caching provider) per RPC URL."""
+    rpc_url = rpc_url or os.getenv("RPC_URL")
+    with _instances_lock:
+        w3 = _instances.get(rpc_url)
+        if w3 is None:
+            w3 = Web3(CachingHTTPProvider(rpc_url))
+            _instances[rpc_url] = w3
+        return w3
+
+
+def uncached(w3):
+    """Context for reads that must see the node's current state; a no-op on providers without a cache."""
+    if isinstance(w3.provider, CachingHTTPProvider):
+        return w3.provider.uncached()
+    return contextlib.nullcontext()
+
+
+def batch_call(w3, calls):
+    """
+    Runs several reads in one JSON-RPC batch and returns their results in
+    order. `calls` are zero-argument callables such as
+    `lambda: w3.eth.get_balance(addr)` or `contract.functions.isPaused()`.
+    Providers without batch support get the same calls one by one.
+    """
+    try:
+        with w3.batch_requests() as batch:
+            for call in calls:
+                batch.add(call if hasattr(call, "call") else call())
+            return batch.execute()
+    except Web3TypeError:
+        return [call.call() if hasattr(call, "call") else call() for call in calls]
@@ -1,8 +1,15 @@
 import os
 import json
 import time
-from web3 import Web3
+import argparse
 from dotenv import load_dotenv, find_dotenv
+from web3 import Web3
+from fee_oracle import FeeOracle
+from rpc_transport import get_web3, batch_call
+from tx_manager import NonceManager, ConfirmationService
+from contracts import get_contract
+from signer import Signer
+from policy_mirror import parse_policy
 
 # Automatically finds and loads your .env file
 load_dotenv(find_dotenv())
@@ -12,14 +19,17 @@ rpc_url = os.getenv("RPC_URL")
 if not rpc_url:
     raise ValueError("❌ RPC_URL not found in .env. Please check your file.")
 
-w3 = Web3(Web3.HTTPProvider(rpc_url))
+w3 = get_web3(rpc_url)
+fees = FeeOracle(w3)
 
 # Load Owner Credentials (Account 1)
 owner_key = os.getenv("PRIVATE_KEY")
 if not owner_key:
     raise ValueError("❌ PRIVATE_KEY (Owner) not found in .env.")
 
-owner_address = w3.eth.account.from_key(owner_key).address
+# The owner key is loaded once; provisioning batches are signed across a process pool
+signer = Signer([owner_key])
+owner_address = signer.address_for(owner_key)
 
 # 2. Contract & Agent Details
 contract_address = os.getenv("CONTRACT_ADDRESS")
@@ -28,70 +38,197 @@ agent_address = os.getenv("AGENT_ADDRESS")
 if not contract_address or not agent_address:
     raise ValueError("❌ Missing CONTRACT_ADDRESS or AGENT_ADDRESS in .env.")
 
-with open("abi.json", "r") as f:
-    contract_abi = json.load(f)
-
-contract = w3.eth.contract(address=contract_address, abi=contract_abi)
-
-def send_tx(func_call, value_wei=0):
-    """Helper function to build, sign, and send transactions."""
-    nonce = w3.eth.get_transaction_count(owner_address)
-    
-    # Build
-    tx = func_call.build_transaction({
-        'from': owner_address,
-        'nonce': nonce,
-        'value': value_wei,
-        'gas': 400000,
-        'gasPrice': w3.eth.gas_price,
-        'chainId': 11155111 # Sepolia
-    })
-    
-    # Sign
-    signed = w3.eth.account.sign_transaction(tx, owner_key)
-    
-    # Send (Updated to .raw_transaction for v6/v7)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    
-    print(f"⏳ Transaction Sent: {tx_hash.hex()}")
-    return w3.eth.wait_for_transaction_receipt(tx_hash)
-
-def run_setup():
-    print(f"🚀 Starting Governance Setup for: {contract_address}")
+contract = get_contract(w3, contract_address)
+
+# Owner nonces are sequenced locally so provisioning txs can be pipelined
+nonces = NonceManager(w3, owner_address)
+
+def rebroadcast(tx):
+    """Re-sends a stuck provisioning tx with bumped fees under the same nonce."""
+    bumped = fees.bump(tx)
+    return w3.eth.send_raw_transaction(signer.sign(owner_address, bumped)), bumped
+
+# One block follower confirms every provisioning tx
+confirmations = ConfirmationService(w3, nonces, rebroadcast=rebroadcast)
+
+# Entries per configureAgents/addMerchants tx, and reads per JSON-RPC batch
+BATCH_SIZE = 50
+READ_BATCH_SIZE = 100
+
+def chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def build_tx(func_call=None, value_wei=0, **extra):
+    """Reserves the owner's next nonce and builds an unsigned transaction."""
+    nonce = nonces.reserve()
+    try:
+        # EIP-1559 fees + cached chain id from the fee oracle
+        tx_params = fees.tx_params(owner_address, nonce, value=value_wei, **extra)
+        if func_call is None:
+            return tx_params
+        tx_params['gas'] = fees.estimate_gas(func_call, tx_params, default=400000)
+        return func_call.build_transaction(tx_params)
+    except Exception:
+        nonces.release(nonce)
+        raise
+
+def send_all(txs):
+    """
+    Signs every built tx in one pass over the signer pool, then broadcasts
+    them in nonce order. Returns a Future per tx for its receipt.
+    """
+    pending = []
+    try:
+        raw_txs = signer.sign_many([(owner_address, tx) for tx in txs])
+        for tx, raw_tx in zip(txs, raw_txs):
+            # Tracked before the broadcast, so the block follower cannot miss its block
+            tx_hash = Web3.keccak(raw_tx)
+            confirmed = confirmations.add(tx_hash, tx["nonce"], tx)
+            try:
+                w3.eth.send_raw_transaction(raw_tx)
+            except Exception:
+                confirmations.discard(tx_hash)
+                raise
+            nonces.track(tx["nonce"], tx_hash)
+            print(f"⏳ Transaction Sent: {tx_hash.hex()}")
+            pending.append(confirmed)
+    except Exception:
+        release_unsent(txs[len(pending):])
+        raise
+    return pending
+
+def release_unsent(txs):
+    """Hands back the nonces of txs that never made it out, newest first."""
+    for tx in reversed(txs):
+        nonces.release(tx["nonce"])
+
+def load_manifest(path):
+    """
+    Reads a provisioning manifest (see provision.example.json): agents with
+    daily limits and cooldowns, merchants with labels, and the vault balance to keep.
+    """
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    return {
+        "agents": [{
+            "address": w3.to_checksum_address(agent["address"]),
+            "name": agent["name"],
+            "daily_limit": w3.to_wei(agent["daily_limit_eth"], 'ether'),
+            "cooldown": int(agent.get("cooldown", 0)),
+        } for agent in manifest.get("agents", [])],
+        "merchants": [{
+            "address": w3.to_checksum_address(merchant["address"]),
+            "label": merchant.get("label", ""),
+        } for merchant in manifest.get("merchants", [])],
+        "vault_wei": w3.to_wei(manifest.get("vault_eth", 0), 'ether'),
+    }
 
-    # A. Configure the Agent (Limit: 0.05 ETH, Cooldown: 0)
-    print("\n🤖 Configuring Agent Permissions...")
-    daily_limit = w3.to_wei(0.05, 'ether')
-    receipt = send_tx(contract.functions.configureAgent(agent_address, "AI-Agent-01", daily_limit, 0))
-    print(f"✅ Agent Authorized (Status: {receipt['status']})")
-
-    # B. Whitelist the Merchant
-    # For demo, we whitelist the Owner address so money goes back to you
-    print("\n🏪 Whitelisting Merchant...")
-    receipt = send_tx(contract.functions.addMerchant(owner_address, "Cloud-Provider-Alpha"))
-    print(f"✅ Merchant Whitelisted (Status: {receipt['status']})")
-
-    # C. Fund the Contract Vault
-    # The contract needs money inside it to execute the AI's purchase
-    print("\n💰 Funding Contract Vault with 0.02 ETH...")
-    nonce = w3.eth.get_transaction_count(owner_address)
-    fund_tx = {
-        'to': contract_address,
-        'value': w3.to_wei(0.02, 'ether'),
-        'gas': 22000,
-        'nonce': nonce,
-        'gasPrice': w3.eth.gas_price,
-        'chainId': 11155111
+def demo_manifest():
+    """The single-agent demo: 0.05 ETH/day, no cooldown, the owner as merchant, 0.02 ETH in the vault."""
+    return {
+        "agents": [{"address": w3.to_checksum_address(agent_address), "name": "AI-Agent-01", "daily_limit": w3.to_wei(0.05, 'ether'), "cooldown": 0}],
+        # For demo, we whitelist the Owner address so money goes back to you
+        "merchants": [{"address": owner_address, "label": "Cloud-Provider-Alpha"}],
+        "vault_wei": w3.to_wei(0.02, 'ether'),
     }
-    signed_fund = w3.eth.account.sign_transaction(fund_tx, owner_key)
-    tx_hash = w3.eth.send_raw_transaction(signed_fund.raw_transaction)
-    w3.eth.wait_for_transaction_receipt(tx_hash)
-    print("✅ Vault Funded Successfully.")
+
+def plan(manifest):
+    """
+    Diffs the manifest against on-chain state (batched reads) and returns
+    only what has to change. Agents whose name, limit and cooldown already
+    match are skipped, so re-running a manifest does not reset their daily spend.
+    Merchant labels only live in events, so whitelisted merchants are skipped whatever their label.
+    """
+    agents = manifest["agents"]
+    merchants = manifest["merchants"]
+    calls = [contract.functions.agents(agent["address"]) for agent in agents]
+    calls += [contract.functions.whitelistedMerchants(merchant["address"]) for merchant in merchants]
+    calls.append(lambda: w3.eth.get_balance(contract_address))
+    results = []
+    for chunk in chunks(calls, READ_BATCH_SIZE):
+        results += batch_call(w3, chunk)
+
+    policies = results[:len(agents)]
+    whitelisted = results[len(agents):len(agents) + len(merchants)]
+    vault_balance = results[-1]
+
+    agent_changes = []
+    for agent, policy in zip(agents, policies):
+        policy = parse_policy(policy)
+        if (policy["name"], policy["daily_limit"], policy["cooldown"], policy["active"]) != (agent["name"], agent["daily_limit"], agent["cooldown"], True):
+            agent_changes.append(agent)
+    merchant_changes = [merchant for merchant, listed in zip(merchants, whitelisted) if not listed]
+
+    return {
+        "agents": agent_changes,
+        "merchants": merchant_changes,
+        "fund_wei": max(0, manifest["vault_wei"] - vault_balance),
+    }
+
+def provision(manifest, dry_run=False):
+    """
+    Brings the contract to the manifest's state. Every change is built on
+    locally sequenced nonces (batched through configureAgents/addMerchants),
+    signed in one pass, broadcast back to back, and then all receipts are
+    awaited together.
+    Returns the receipts.
+    """
+    changes = plan(manifest)
+    print(f"📋 Plan: {len(changes['agents'])}/{len(manifest['agents'])} agents to configure, "
+          f"{len(changes['merchants'])}/{len(manifest['merchants'])} merchants to whitelist, "
+          f"{w3.from_wei(changes['fund_wei'], 'ether')} ETH to fund.")
+    if dry_run:
+        return []
+
+    txs = []
+    try:
+        # A. Configure the Agents
+        for batch in chunks(changes["agents"], BATCH_SIZE):
+            print(f"\n🤖 Configuring {len(batch)} Agent(s)...")
+            configs = [(agent["address"], agent["name"], agent["daily_limit"], agent["cooldown"]) for agent in batch]
+            txs.append(build_tx(contract.functions.configureAgents(configs)))
+
+        # B. Whitelist the Merchants
+        for batch in chunks(changes["merchants"], BATCH_SIZE):
+            print(f"\n🏪 Whitelisting {len(batch)} Merchant(s)...")
+            txs.append(build_tx(contract.functions.addMerchants([(m["address"], m["label"]) for m in batch])))
+
+        # C. Fund the Contract Vault
+        # The contract needs money inside it to execute the AI's purchase
+        if changes["fund_wei"]:
+            print(f"\n💰 Funding Contract Vault with {w3.from_wei(changes['fund_wei'], 'ether')} ETH...")
+            txs.append(build_tx(value_wei=changes["fund_wei"], to=contract_address, gas=22000))
+    except Exception:
+        release_unsent(txs)
+        raise
+
+    print(f"\n✍️ Signing and sending {len(txs)} transaction(s)...")
+    pending = send_all(txs)
+    receipts = [future.result() for future in pending]
+    if None in receipts:
+        raise RuntimeError(f"❌ {receipts.count(None)} provisioning transaction(s) were dropped; re-run to retry.")
+    failed = [receipt for receipt in receipts if receipt["status"] != 1]
+    if failed:
+        raise RuntimeError(f"❌ {len(failed)} provisioning transaction(s) reverted: "
+                           f"{[receipt['transactionHash'].hex() for receipt in failed]}")
+    print(f"✅ {len(receipts)} transaction(s) confirmed.")
+    return receipts
+
+def run_setup(manifest_path=None, dry_run=False):
+    print(f"🚀 Starting Governance Setup for: {contract_address}")
+
+    manifest = load_manifest(manifest_path) if manifest_path else demo_manifest()
+    provision(manifest, dry_run=dry_run)
 
     print("\n" + "="*40)
     print("🎉 DEMO SETUP COMPLETE!")
-    print(f"Agent {agent_address} is now READY.")
+    for agent in manifest["agents"]:
+        print(f"Agent {agent['address']} is now READY.")
     print("="*40)
 
 if __name__ == "__main__":
-    run_setup()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Configure agents, whitelist merchants and fund the vault")
+    parser.add_argument("--manifest", help="provisioning manifest (default: the single-agent demo)")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    args = parser.parse_args()
+    run_setup(args.manifest, args.dry_run)
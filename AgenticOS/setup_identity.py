@@ -1,11 +1,12 @@
-from eth_account import Account
 import os
+from eth_keys import keys
 
 def generate():
-    acc = Account.create()
+    # eth_keys is all a new key needs; eth_account would triple the start-up time
+    key = keys.PrivateKey(os.urandom(32))
     print(f"--- SAVE THESE TO .env ---")
-    print(f"AGENT_ADDRESS={acc.address}")
-    print(f"AGENT_PRIVATE_KEY={acc.key.hex()}")
+    print(f"AGENT_ADDRESS={key.public_key.to_checksum_address()}")
+    print(f"AGENT_PRIVATE_KEY={key.to_bytes().hex()}")
 
 if __name__ == "__main__":
     generate()
\ No newline at end of file
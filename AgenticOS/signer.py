@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+# Batches smaller than this are signed in-process: shipping them to a worker costs more than it saves
+MIN_POOL_BATCH = int(os.getenv("SIGNER_MIN_POOL_BATCH", "4"))
+SIGNER_WORKERS = int(os.getenv("SIGNER_WORKERS", "0")) or os.cpu_count() or 1
+
+# Worker-process state: address -> LocalAccount, loaded once by the pool initializer
+_accounts = {}
+
+
+def _init_worker(keys):
+    for key in keys:
+        account = Account.from_key(key)
+        _accounts[account.address] = account
+
+
+def _sign_chunk(items):
+    return [bytes(_accounts[address].sign_transaction(tx).raw_transaction) for address, tx in items]
+
+
+class Signer:
+    """
+    Signs transactions for a fixed set of private keys. Each key becomes a
+    LocalAccount once, here and once in every worker process, instead of
+    being re-derived from hex on every sign_transaction call.
+
+    sign() signs one tx inline. sign_many() spreads a batch over a process
+    pool (signing is pure CPU, so threads would only contend for the GIL).
+    submit() does the same without blocking and returns a Future, which
+    async callers can await through asyncio.wrap_future. Batches below
+    min_pool_batch are signed inline by both, since pickling them over to
+    a worker costs more than signing them. The pool is started on first
+    use; every result is the raw signed tx bytes, ready for
+    send_raw_transaction.
+    """
+
+    def __init__(self, keys, workers=SIGNER_WORKERS, min_pool_batch=MIN_POOL_BATCH):
+        self._keys = [key for key in keys if key]
+        self.accounts = {}  # address -> LocalAccount
+        self._by_key = {}
+        for key in self._keys:
+            account = Account.from_key(key)
+            self.accounts[account.address] = account
+            self._by_key[key] = account.address
+        self.workers = max(1, workers)
+        self.min_pool_batch = min_pool_batch
+        self._pool = None
+
+    def address_for(self, key):
+        return self._by_key.get(key) or Account.from_key(key).address
+
+    def _account(self, address):
+        account = self.accounts.get(address) or self.accounts.get(to_checksum_address(address))
+        if account is None:
+            raise KeyError(f"No signing key loaded for {address}")
+        return account
+
+    def _normalize(self, items):
+        return [(self._account(address).address, tx) for address, tx in items]
+
+    def sign(self, address, tx):
+        """Raw signed bytes of one tx, signed in this process."""
+        return bytes(self._account(address).sign_transaction(tx).raw_transaction)
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn, not fork: callers (confirmation service, timers, waitress) run threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._keys,),
+            )
+        return self._pool
+
+    def _chunks(self, items):
+        size = -(-len(items) // self.workers)
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _inline(self, items):
+        return self.workers == 1 or len(items) < self.min_pool_batch
+
+    def _sign_inline(self, items):
+        return [bytes(self.accounts[address].sign_transaction(tx).raw_transaction) for address, tx in items]
+
+    def sign_many(self, items):
+        """Signs [(address, tx), ...]; returns the raw txs in the same order."""
+        items = self._normalize(items)
+        if self._inline(items):
+            return self._sign_inline(items)
+        chunks = self._get_pool().map(_sign_chunk, self._chunks(items))
+        return [raw for chunk in chunks for raw in chunk]
+
+    def submit(self, items):
+        """Like sign_many, but returns a Future for the list of raw txs instead of blocking on the pool."""
+        items = self._normalize(items)
+        if self._inline(items):
+            result = Future()
+            try:
+                result.set_result(self._sign_inline(items))
+            except Exception as e:
+                result.set_exception(e)
+            return result
+        futures = [self._get_pool().submit(_sign_chunk, chunk) for chunk in self._chunks(items)]
+        result = Future()
+        if not futures:
+            result.set_result([])
+            return result
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def collect(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                result.set_result([raw for future in futures for raw in future.result()])
+            except Exception as e:
+                result.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(collect)
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,391 @@
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from agent_brain import DecisionEngine, DecisionCache, rule_engine, parse_defer, WAIT
+from stats import percentile
+from main_agent import parse_decision
+from policy_mirror import check_spend, apply_spend
+from rate_limiter import Backoff
+from status_registry import DEFAULT_STATUS
+
+# Offline spend and throughput planner: replays a status trace through the
+# agent's real decision path and main_agent's retry rules against a local
+# model of the contract's budget and cooldown checks, on a virtual clock.
+# Nothing is sent anywhere, so a month of traffic takes seconds and a whole
+# grid of policies can be compared before one is configured on chain.
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+# Chain time at the start of every simulation
+T0 = 1_700_000_000
+
+DEFAULT_CONFIG = {
+    "daily_limit_eth": 0.01,
+    "cooldown": 60,
+    "amount_eth": 0.001,     # what BlockchainBody pays per purchase
+    "vault_eth": 1.0,
+    "confirm_seconds": 12,   # decide → receipt (about one block)
+    "report_seconds": 0.5,   # receipt → trigger_service reverted the status
+    "fast_path": True,       # False: every decision goes through the cache and the (stub) LLM
+    "llm_seconds": 1.5,      # simulated latency of one LLM call
+    "speed": 0,              # virtual seconds per wall second; 0 runs as fast as possible
+}
+
+
+def to_wei(eth):
+    return int(Decimal(str(eth)) * 10 ** 18)
+
+
+def synthetic_trace(days=7, overloads_per_day=6, renewals_per_day=1, seed=0):
+    """
+    Problems arriving as Poisson processes, like /trigger/overload and
+    /trigger/sub fired at random: {"duration": s, "events": [(t, changes)]}.
+    """
+    rng = random.Random(seed)
+    duration = days * DAY
+    events = []
+    for per_day, make in (
+        (overloads_per_day, lambda: {"load": rng.randint(86, 100)}),
+        (renewals_per_day, lambda: {"sub_days": rng.randint(0, 2)}),
+    ):
+        if per_day <= 0:
+            continue
+        t = rng.expovariate(per_day / DAY)
+        while t < duration:
+            events.append((t, make()))
+            t += rng.expovariate(per_day / DAY)
+    events.sort(key=lambda event: event[0])
+    return {"duration": duration, "events": events}
+
+
+def load_trace(path):
+    """
+    A recorded trace: JSON as written by --save-trace, or CSV with a
+    header of t plus the status metrics (e.g. t,load,sub_days; empty cells
+    are left unchanged). Times are shifted so the trace starts at 0.
+    """
+    if path.endswith(".csv"):
+        events = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                t = float(row.pop("t"))
+                changes = {metric: float(value) for metric, value in row.items() if value not in ("", None)}
+                events.append((t, changes))
+        trace = {"events": events}
+    else:
+        with open(path) as f:
+            trace = json.load(f)
+    events = sorted(((float(t), dict(changes)) for t, changes in trace["events"]), key=lambda event: event[0])
+    start = events[0][0] if events else 0.0
+    events = [(t - start, changes) for t, changes in events]
+    duration = trace.get("duration") or (events[-1][0] + HOUR if events else 0.0)
+    return {"duration": float(duration), "events": events}
+
+
+def fetch_trace(api_url, system_id=None, hours=24, buckets=1000):
+    """
+    Builds a trace from trigger_service's downsampled series. Only the
+    problems are kept (a bucket whose max load or min sub_days crosses the
+    rules' thresholds), since in the simulation the recoveries come from
+    the simulated purchases.
+    """
+    import requests
+
+    end = time.time()
+    start = end - hours * HOUR
+    url = f"{api_url}/status/{system_id}/series" if system_id else f"{api_url}/status/series"
+    response = requests.get(url, params={"start": start, "end": end, "buckets": buckets}, timeout=10)
+    response.raise_for_status()
+    metrics = response.json()["metrics"]
+    events = []
+    was_problem = False
+    for load_row, sub_row in zip(metrics["load"], metrics["sub_days"]):
+        changes = {}
+        if load_row[3] is not None and load_row[3] > 85:
+            changes["load"] = load_row[3]
+        if sub_row[1] is not None and sub_row[1] < 3:
+            changes["sub_days"] = sub_row[1]
+        if changes and not was_problem:
+            events.append((load_row[0] - start, changes))
+        was_problem = bool(changes)
+    return {"duration": end - start, "events": events}
+
+
+def is_problem(status):
+    return parse_decision(rule_engine(status) or WAIT) is not None
+
+
+def simulate(trace, config=None):
+    """
+    Runs one agent through `trace` under `config` (see DEFAULT_CONFIG) and
+    returns its report. The agent behaves like main_agent.run: it decides
+    on every status change, schedules deferred decisions and rejected
+    purchases for retry (exactly when the contract allows it, or with
+    backoff), is busy while a purchase confirms and is reported, and
+    trigger_service reverts the status to the baseline once it is.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    amount = to_wei(config["amount_eth"])
+    vault = to_wei(config["vault_eth"])
+    policy = {
+        "daily_limit": to_wei(config["daily_limit_eth"]),
+        "spent_today": 0,
+        "last_reset": T0,
+        "cooldown": int(config["cooldown"]),
+        "last_tx": 0,
+        "active": True,
+    }
+
+    llm_calls = [0]
+
+    def stub_llm(status_data):
+        # Answers like the prompt RULES; its latency is added to the virtual clock instead of slept
+        llm_calls[0] += 1
+        return rule_engine(status_data) or WAIT
+
+    engine = DecisionEngine(
+        rules=rule_engine if config["fast_path"] else None,
+        llm=stub_llm,
+        cache=DecisionCache(),
+    )
+    backoff = Backoff(base=1, cap=60)
+
+    status = dict(DEFAULT_STATUS)
+    version = 1
+    seen_version = 0
+    busy = False
+    retry_token = 0
+    problem_since = None
+
+    decide_ms = []
+    fix_seconds = []
+    purchases = 0
+    spent = 0
+    rejections = {}
+    exhaustions = []  # hours into the trace at which each budget day ran out
+    exhausted_windows = set()
+
+    events = []
+    seq = itertools.count()
+
+    def schedule(at, kind, payload=None):
+        heapq.heappush(events, (at, next(seq), kind, payload))
+
+    def schedule_eval(at):
+        nonlocal retry_token
+        retry_token += 1
+        schedule(at, "eval", retry_token)
+
+    def set_status(changes, t):
+        nonlocal version, problem_since
+        if all(status.get(k) == v for k, v in changes.items()):
+            return False
+        was_problem = is_problem(status)
+        status.update(changes)
+        version += 1
+        now_problem = is_problem(status)
+        if now_problem and not was_problem:
+            problem_since = t
+        elif was_problem and not now_problem:
+            fix_seconds.append(t - problem_since)
+            problem_since = None
+        return True
+
+    for t, changes in trace["events"]:
+        schedule(t, "trace", changes)
+
+    speed = config["speed"]
+    wall_start = time.perf_counter()
+    while events and events[0][0] <= trace["duration"]:
+        t, _, kind, payload = heapq.heappop(events)
+        if speed:
+            ahead = t / speed - (time.perf_counter() - wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+        now = T0 + int(t)
+
+        if kind == "trace":
+            if set_status(payload, t) and not busy:
+                schedule_eval(t)
+
+        elif kind == "eval":
+            if payload != retry_token or busy:
+                continue  # superseded by a newer status or retry
+            seen_version = version
+            calls_before = llm_calls[0]
+            started = time.perf_counter()
+            decision = engine.decide(status)
+            elapsed = time.perf_counter() - started
+            if llm_calls[0] > calls_before:
+                elapsed += config["llm_seconds"]
+            decide_ms.append(elapsed * 1000)
+            t += elapsed
+
+            retry_in = parse_defer(decision)
+            if retry_in is not None:
+                schedule_eval(t + retry_in)
+                continue
+            if parse_decision(decision) is None:
+                continue
+
+            if vault < amount:
+                rejection = {"error": "InsufficientContractBalance", "retry_in": None}
+            else:
+                rejection = check_spend(policy, amount, T0 + int(t))
+            if rejection is not None:
+                rejections[rejection["error"]] = rejections.get(rejection["error"], 0) + 1
+                if rejection["error"] == "DailyBudgetExceeded" and policy["last_reset"] not in exhausted_windows:
+                    exhausted_windows.add(policy["last_reset"])
+                    exhaustions.append(t / HOUR)
+                if rejection["retry_in"] is not None:
+                    delay = rejection["retry_in"] + 1
+                else:
+                    delay = backoff.next()
+                schedule_eval(t + delay)
+                continue
+            busy = True
+            schedule(t + config["confirm_seconds"], "mined")
+
+        elif kind == "mined":
+            apply_spend(policy, amount, now)
+            vault -= amount
+            spent += amount
+            purchases += 1
+            backoff.reset()
+            schedule(t + config["report_seconds"], "reported")
+
+        elif kind == "reported":
+            busy = False
+            set_status(DEFAULT_STATUS, t)
+            if version != seen_version:
+                schedule_eval(t)
+
+    if speed:
+        time.sleep(max(0.0, trace["duration"] / speed - (time.perf_counter() - wall_start)))
+    wall_seconds = time.perf_counter() - wall_start
+    unresolved = 0
+    if problem_since is not None:
+        unresolved = 1
+        fix_seconds.append(trace["duration"] - problem_since)
+    stats = engine.stats()
+    return {
+        "config": {key: config[key] for key in ("daily_limit_eth", "cooldown", "amount_eth")},
+        "days": trace["duration"] / DAY,
+        "problems": len(fix_seconds),
+        "purchases": purchases,
+        "spend_eth": spent / 10 ** 18,
+        "rejections": rejections,
+        "exhaustions": len(exhaustions),
+        "exhausted_at_hours": [round(hours, 2) for hours in exhaustions],
+        "unresolved_at_end": unresolved,
+        "fix_p50_s": percentile(fix_seconds, 50) if fix_seconds else 0.0,
+        "fix_p99_s": percentile(fix_seconds, 99) if fix_seconds else 0.0,
+        "decisions": stats["decisions"],
+        "llm_calls": stats["llm_calls"],
+        "decide_p50_ms": percentile(decide_ms, 50) if decide_ms else 0.0,
+        "decide_p99_ms": percentile(decide_ms, 99) if decide_ms else 0.0,
+        "wall_seconds": wall_seconds,
+        "speedup": trace["duration"] / wall_seconds if wall_seconds else float("inf"),
+    }
+
+
+def _simulate_args(args):
+    return simulate(*args)
+
+
+def sweep(trace, grid, base=None, workers=None):
+    """
+    Simulates every combination of `grid` ({config key: [values]}) on top
+    of `base`, one process per core (each run is pure CPU). Reports come
+    back in grid order.
+    """
+    keys = list(grid)
+    configs = [{**(base or {}), **dict(zip(keys, values))} for values in itertools.product(*(grid[k] for k in keys))]
+    workers = min(len(configs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [simulate(trace, config) for config in configs]
+    # spawn, like the signer pool: a forked worker would inherit whatever threads the caller runs
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_simulate_args, [(trace, config) for config in configs]))
+
+
+def _floats(text):
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace-driven spend and throughput simulator")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help="recorded trace (.json or .csv with t,load,sub_days)")
+    source.add_argument("--from-service", metavar="API_URL", help="build the trace from trigger_service's series")
+    parser.add_argument("--system-id", help="system to fetch with --from-service")
+    parser.add_argument("--hours", type=float, default=24, help="history to fetch with --from-service")
+    parser.add_argument("--days", type=float, default=7, help="synthetic trace length")
+    parser.add_argument("--overloads-per-day", type=float, default=6)
+    parser.add_argument("--renewals-per-day", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-trace", help="write the trace used to this JSON file")
+    parser.add_argument("--daily-limit", type=_floats, default=[0.005, 0.01, 0.05], help="ETH, comma separated")
+    parser.add_argument("--cooldown", type=_floats, default=[0, 600, 3600], help="seconds, comma separated")
+    parser.add_argument("--amount", type=float, default=DEFAULT_CONFIG["amount_eth"], help="ETH per purchase")
+    parser.add_argument("--vault", type=float, default=DEFAULT_CONFIG["vault_eth"], help="ETH in the contract")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every status to the (stub) LLM")
+    parser.add_argument("--llm-latency", type=float, default=DEFAULT_CONFIG["llm_seconds"])
+    parser.add_argument("--speed", type=float, default=0, help="pace at this many x wall clock (e.g. 1000); 0 = unpaced")
+    parser.add_argument("--workers", type=int, default=0, help="processes for the sweep (default: one per core)")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    elif args.from_service:
+        trace = fetch_trace(args.from_service, args.system_id, args.hours)
+    else:
+        trace = synthetic_trace(args.days, args.overloads_per_day, args.renewals_per_day, args.seed)
+    if args.save_trace:
+        with open(args.save_trace, "w") as f:
+            json.dump(trace, f)
+
+    base = {
+        "amount_eth": args.amount,
+        "vault_eth": args.vault,
+        "fast_path": not args.no_fast_path,
+        "llm_seconds": args.llm_latency,
+        "speed": args.speed,
+    }
+    grid = {"daily_limit_eth": args.daily_limit, "cooldown": [int(c) for c in args.cooldown]}
+    started = time.perf_counter()
+    reports = sweep(trace, grid, base, args.workers)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print("=" * 104)
+    print(f"🧪 SIMULATION: {trace['duration'] / DAY:.1f} days, {len(trace['events'])} status events, "
+          f"{len(reports)} configurations in {elapsed:.1f}s")
+    print(f"{'limit ETH':>9} | {'cooldown':>8} | {'buys':>5} | {'spend ETH':>9} | {'exhausted':>9} | "
+          f"{'first (h)':>9} | {'fix p50':>8} | {'fix p99':>8} | {'open':>4} | {'decide p99':>10} | {'speedup':>9}")
+    print("-" * 104)
+    for report in reports:
+        config = report["config"]
+        first = report["exhausted_at_hours"][0] if report["exhausted_at_hours"] else None
+        print(f"{config['daily_limit_eth']:>9g} | {config['cooldown']:>7}s | {report['purchases']:>5} | "
+              f"{report['spend_eth']:>9.4f} | {report['exhaustions']:>9} | "
+              f"{'-' if first is None else f'{first:.1f}':>9} | "
+              f"{report['fix_p50_s'] / 60:>6.1f}m | {report['fix_p99_s'] / 60:>6.1f}m | "
+              f"{report['unresolved_at_end']:>4} | {report['decide_p99_ms']:>8.2f}ms | {report['speedup']:>8,.0f}x")
+    print("=" * 104)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import re
+import threading
+import time
+from timeseries import RingSeries
+
+DEFAULT_SYSTEM = "default"
+DEFAULT_STATUS = {"load": 45, "sub_days": 15}
+MAX_SYSTEMS = 10000
+
+# Ids end up in URLs; "poll", "stream" and "series" are taken by the default system's routes
+SYSTEM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+RESERVED_IDS = {"poll", "stream", "series"}
+
+
+class RegistryFull(Exception):
+    pass
+
+
+class MonitoredSystem:
+    """
+    One system's status. Every change bumps its version, is recorded in
+    the system's ring-buffer series and wakes up the threads long-polling
+    it; each system has its own lock, so traffic on one system never waits
+    on another.
+    """
+
+    def __init__(self, system_id, baseline):
+        self.system_id = system_id
+        self.baseline = dict(baseline)
+        self.status = dict(baseline)
+        self.version = 1
+        self.changed = threading.Condition()
+        self.series = RingSeries()
+        self.series.append(time.time(), self.status)
+
+    def snapshot(self):
+        with self.changed:
+            return self.version, dict(self.status)
+
+    def _apply(self, changes):
+        if all(self.status.get(k) == v for k, v in changes.items()):
+            return False
+        self.status.update(changes)
+        self.version += 1
+        self.series.append(time.time(), self.status)
+        self.changed.notify_all()
+        return True
+
+    def update(self, changes, expected_version=None):
+        """
+        Applies changes atomically. With expected_version, only if nobody
+        changed the system since that version (compare-and-set).
+        Returns (applied, version, status); a no-op update counts as applied.
+        """
+        with self.changed:
+            if expected_version is not None and expected_version != self.version:
+                return False, self.version, dict(self.status)
+            self._apply(changes)
+            return True, self.version, dict(self.status)
+
+    def revert(self):
+        """Back to the baseline, e.g. once a payment fixed the problem."""
+        with self.changed:
+            self._apply(self.baseline)
+            return self.version, dict(self.status)
+
+    def history(self, start, end, buckets):
+        """Downsampled metrics over [start, end): {metric: [[bucket_start, min, avg, max], ...]}."""
+        with self.changed:
+            return self.series.downsample(start, end, buckets)
+
+    def wait_for_version(self, since, timeout):
+        """Blocks until version > since (or timeout) and returns the current snapshot."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > since, timeout)
+            return self.version, dict(self.status)
+
+
+class StatusRegistry:
+    """
+    Thread-safe map of system id -> MonitoredSystem. Systems are created
+    by writes (get/register) only; reads go through find(), so unknown ids
+    cannot fill the registry. The default system always exists.
+    """
+
+    def __init__(self, baseline=DEFAULT_STATUS, max_systems=MAX_SYSTEMS):
+        self.baseline = dict(baseline)
+        self.max_systems = max_systems
+        self._systems = {}
+        self._lock = threading.Lock()
+        self.register(DEFAULT_SYSTEM)
+
+    def find(self, system_id):
+        """The system's entry, or None if it was never registered."""
+        return self._systems.get(system_id)  # lock-free: entries are never removed
+
+    def get(self, system_id, baseline=None):
+        """The system's entry; unknown ids are registered with `baseline` (default: the registry's)."""
+        return self.register(system_id, baseline)[0]
+
+    def register(self, system_id, baseline=None):
+        """(entry, created): registers system_id with `baseline` unless it already exists."""
+        if not isinstance(system_id, str):
+            raise ValueError(f"Invalid system id: {system_id!r}")
+        system = self._systems.get(system_id)
+        if system is not None:
+            return system, False
+        if not SYSTEM_ID_PATTERN.match(system_id) or system_id in RESERVED_IDS:
+            raise ValueError(f"Invalid system id: {system_id!r}")
+        with self._lock:
+            system = self._systems.get(system_id)
+            if system is not None:
+                return system, False
+            if len(self._systems) >= self.max_systems:
+                raise RegistryFull(f"Registry is full ({self.max_systems} systems)")
+            system = self._systems[system_id] = MonitoredSystem(system_id, baseline or self.baseline)
+            return system, True
+
+    def snapshot_many(self, system_ids):
+        """{id: {"version", "status"}} for several registered systems; each entry is consistent on its own."""
+        result = {}
+        for system_id in system_ids:
+            version, status = self._systems[system_id].snapshot()
+            result[system_id] = {"version": version, "status": status}
+        return result
+
+    def ids(self):
+        with self._lock:
+            return sorted(self._systems)
+
+    def __len__(self):
+        return len(self._systems)
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds: covers a fast-path decision up to a slow receipt wait
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Counters and histograms keyed by (name, sorted label pairs)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.total}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Plain-dict view for logs and benchmarks."""
+        with self._lock:
+            return {
+                "counters": {f"{name}{_labels(labels)}": value for (name, labels), value in self.counters.items()},
+                "histograms": {
+                    f"{name}{_labels(labels)}": {"count": h.total, "sum": h.sum}
+                    for (name, labels), h in self.histograms.items()
+                },
+            }
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+registry = Registry()
+
+# --- Spans / JSON-lines traces ---
+
+_trace_lock = threading.Lock()
+_trace_file = None
+_context = threading.local()
+
+
+def _write_trace(record):
+    global _trace_file
+    path = os.getenv("AGENT_TRACE_FILE")
+    if not path:
+        return
+    with _trace_lock:
+        if _trace_file is None:
+            _trace_file = open(path, "a", buffering=1)
+        _trace_file.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def span(phase, **attrs):
+    """
+    Times a phase of the agent loop into the `agent_phase_seconds`
+    histogram. Spans nest per thread; with AGENT_TRACE_FILE set, each span
+    is also appended to that file as one JSON line.
+    """
+    stack = getattr(_context, "stack", None)
+    if stack is None:
+        stack = _context.stack = []
+    parent = stack[-1] if stack else None
+    record = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": phase,
+        "start": time.time(),
+        "attrs": attrs,
+    }
+    stack.append(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = repr(e)
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - started
+        stack.pop()
+        registry.observe("agent_phase_seconds", record["duration"], phase=phase)
+        _write_trace(record)
+
+
+def count(name, amount=1, **labels):
+    registry.count(name, amount, **labels)
+
+
+# --- /metrics endpoint ---
+
+_server = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serves /metrics on a background thread (once per process). Port 0 disables it."""
+    global _server
+    if _server is not None:
+        return _server
+    port = int(os.getenv("METRICS_PORT", "9108")) if port is None else port
+    if port == 0:
+        return None
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint unavailable on port {port}: {e}", flush=True)
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics at http://{host}:{port}/metrics", flush=True)
+    return _server
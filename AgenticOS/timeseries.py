@@ -0,0 +1,114 @@
+import math
+import os
+from array import array
+
+# Samples kept per system (8 bytes per metric per sample); the oldest are overwritten
+DEFAULT_CAPACITY = int(os.getenv("STATUS_SERIES_CAPACITY", "2048"))
+MAX_BUCKETS = 1000
+
+
+class RingSeries:
+    """
+    Fixed-capacity time series of numeric status metrics, one flat
+    array('d') per column. Appends are O(1); once `capacity` samples are
+    held, each append overwrites the oldest, so memory stays bounded no
+    matter how long the service runs. Not thread-safe on its own: the
+    owning MonitoredSystem appends and queries under its lock.
+    """
+
+    def __init__(self, metrics=("load", "sub_days"), capacity=DEFAULT_CAPACITY):
+        self.metrics = tuple(metrics)
+        self.capacity = capacity
+        self.times = array("d")
+        self.columns = {metric: array("d") for metric in self.metrics}
+        self.head = 0  # physical index of the oldest sample once the buffer is full
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, timestamp, status):
+        values = [_as_float(status.get(metric)) for metric in self.metrics]
+        if len(self.times) < self.capacity:
+            self.times.append(timestamp)
+            for metric, value in zip(self.metrics, values):
+                self.columns[metric].append(value)
+            return
+        self.times[self.head] = timestamp
+        for metric, value in zip(self.metrics, values):
+            self.columns[metric][self.head] = value
+        self.head = (self.head + 1) % self.capacity
+
+    def _physical(self, i):
+        return (self.head + i) % len(self.times) if self.head else i
+
+    def _first_after(self, timestamp):
+        """Logical index of the first sample with time > timestamp."""
+        lo, hi = 0, len(self.times)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._physical(mid)] <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start, end):
+        """
+        (times, {metric: values}) for samples in (start, end], plus the
+        sample in effect at `start` (the status is a step function).
+        """
+        first = max(0, self._first_after(start) - 1)
+        last = self._first_after(end)
+        indexes = [self._physical(i) for i in range(first, last)]
+        return (
+            [self.times[i] for i in indexes],
+            {metric: [self.columns[metric][i] for i in indexes] for metric in self.metrics},
+        )
+
+    def downsample(self, start, end, buckets):
+        """
+        Splits [start, end) into `buckets` equal buckets and returns, per
+        metric, one [bucket_start, min, avg, max] row per bucket. The status
+        holds its value until the next change, so avg is time-weighted and
+        a bucket without changes carries the previous value. Buckets before
+        the first sample have None values.
+        """
+        buckets = max(1, min(buckets, MAX_BUCKETS))
+        width = (end - start) / buckets
+        times, columns = self.range(start, end)
+        result = {}
+        for metric in self.metrics:
+            rows = [[start + b * width, None, None, None] for b in range(buckets)]
+            weights = [0.0] * buckets
+            sums = [0.0] * buckets
+            values = columns[metric]
+            for k, value in enumerate(values):
+                if math.isnan(value):
+                    continue
+                seg_start = max(times[k], start)
+                seg_end = min(times[k + 1] if k + 1 < len(times) else end, end)
+                if seg_end < seg_start:
+                    continue
+                b = min(buckets - 1, int((seg_start - start) / width))
+                while b < buckets:
+                    bucket_end = start + (b + 1) * width
+                    overlap = min(seg_end, bucket_end) - max(seg_start, start + b * width)
+                    row = rows[b]
+                    row[1] = value if row[1] is None else min(row[1], value)
+                    row[3] = value if row[3] is None else max(row[3], value)
+                    weights[b] += overlap
+                    sums[b] += value * overlap
+                    if seg_end <= bucket_end:
+                        break
+                    b += 1
+            for b, row in enumerate(rows):
+                if row[1] is not None:
+                    row[2] = sums[b] / weights[b] if weights[b] > 0 else row[1]
+            result[metric] = rows
+        return result
+
+
+def _as_float(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
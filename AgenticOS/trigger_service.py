@@ -1,43 +1,236 @@
-from flask import Flask, jsonify, request
+import json
+import os
+import time
+import uuid
+from flask import Flask, Response, abort, jsonify, request
 from flask_cors import CORS
+from history_store import HistoryStore, DEFAULT_PAGE_SIZE
+from status_registry import StatusRegistry, RegistryFull, DEFAULT_SYSTEM
+from timeseries import MAX_BUCKETS
 
 app = Flask(__name__)
 CORS(app)
 
-# INITIAL STATE
-system_status = {"load": 45, "sub_days": 15}
-history = []
+# INITIAL STATE: every monitored system starts at the baseline and reverts to it after a payment
+registry = StatusRegistry()
+history = HistoryStore()
+
+MAX_POLL_TIMEOUT = 60
+KEEPALIVE_SECONDS = 15
+
+# Status versions restart with the service; the epoch tells agents which run a version belongs to
+EPOCH = uuid.uuid4().hex[:12]
+
+def get_system(system_id):
+    """Registry entry for system_id, for reads: 404 unless it was registered (by a write or PUT /systems/<id>)."""
+    system = registry.find(system_id)
+    if system is None:
+        abort(404, description=f"Unknown system: {system_id!r}")
+    return system
+
+def write_system(system_id):
+    """Registry entry for system_id, for writes (registered on first use); 400/503 if it cannot be."""
+    try:
+        return registry.get(system_id)
+    except ValueError as e:
+        abort(400, description=str(e))
+    except RegistryFull as e:
+        abort(503, description=str(e))
+
+def status_response(system):
+    version, status = system.snapshot()
+    response = jsonify(status)
+    response.headers['X-Status-Version'] = str(version)
+    response.headers['X-Status-Epoch'] = EPOCH
+    return response
 
 @app.route('/status')
 def get_status():
-    return jsonify(system_status)
+    """The default system's status, or with ?ids=a,b,c a {id: {version, status}} map in one call."""
+    ids = request.args.get('ids')
+    if ids:
+        system_ids = [system_id for system_id in ids.split(',') if system_id]
+        unknown = [system_id for system_id in system_ids if registry.find(system_id) is None]
+        if unknown:
+            abort(404, description=f"Unknown systems: {', '.join(unknown)}")
+        return jsonify(registry.snapshot_many(system_ids))
+    return status_response(get_system(DEFAULT_SYSTEM))
+
+@app.route('/status/<system_id>', methods=['GET'])
+def get_system_status(system_id):
+    return status_response(get_system(system_id))
+
+@app.route('/status/<system_id>', methods=['POST'])
+def set_system_status(system_id):
+    """
+    Atomic update: {"changes": {...}, "expected_version": n}. With
+    expected_version it is a compare-and-set that answers 409 (with the
+    current version and status) if the system changed in the meantime.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict) or not isinstance(data.get('changes'), dict):
+        abort(400, description="Body must include a 'changes' object")
+    expected_version = data.get('expected_version')
+    if expected_version is not None:
+        try:
+            expected_version = int(expected_version)
+        except (TypeError, ValueError):
+            abort(400, description="'expected_version' must be an integer")
+    applied, version, status = write_system(system_id).update(data['changes'], expected_version)
+    response = jsonify({"applied": applied, "version": version, "status": status})
+    return response, (200 if applied else 409)
+
+def series_response(system):
+    """
+    Metrics over a time range, downsampled server-side so the payload stays
+    bounded however long the range: ?start=&end= (unix seconds, default
+    the last hour) and ?buckets= (default 120, max 1000).
+    """
+    end = request.args.get('end', default=time.time(), type=float)
+    start = request.args.get('start', default=end - 3600, type=float)
+    buckets = request.args.get('buckets', default=120, type=int)
+    if start >= end or buckets < 1:
+        abort(400, description="Need start < end and buckets >= 1")
+    return jsonify({
+        "start": start,
+        "end": end,
+        "bucket_seconds": (end - start) / min(buckets, MAX_BUCKETS),
+        "columns": ["t", "min", "avg", "max"],
+        "metrics": system.history(start, end, buckets),
+    })
+
+@app.route('/status/series')
+def default_series():
+    return series_response(get_system(DEFAULT_SYSTEM))
+
+@app.route('/status/<system_id>/series')
+def system_series(system_id):
+    return series_response(get_system(system_id))
+
+@app.route('/systems')
+def list_systems():
+    return jsonify(registry.ids())
+
+@app.route('/systems/<system_id>', methods=['PUT'])
+def register_system(system_id):
+    """
+    Registers a system (idempotent), optionally with its own baseline:
+    {"baseline": {...}}. Agents call this for their system before watching it.
+    """
+    data = request.get_json(silent=True) or {}
+    baseline = data.get('baseline')
+    if baseline is not None and not isinstance(baseline, dict):
+        abort(400, description="'baseline' must be an object")
+    try:
+        system, created = registry.register(system_id, baseline)
+    except ValueError as e:
+        abort(400, description=str(e))
+    except RegistryFull as e:
+        abort(503, description=str(e))
+    version, status = system.snapshot()
+    return jsonify({"system_id": system_id, "version": version, "status": status}), (201 if created else 200)
+
+def poll_response(system):
+    """Long-poll: returns as soon as the version moves past `since`, or after `timeout` seconds."""
+    since = request.args.get('since', default=0, type=int)
+    timeout = min(request.args.get('timeout', default=30, type=float), MAX_POLL_TIMEOUT)
+    version, status = system.wait_for_version(since, timeout)
+    return jsonify({"version": version, "status": status, "epoch": EPOCH})
+
+@app.route('/status/poll')
+def poll_status():
+    return poll_response(get_system(DEFAULT_SYSTEM))
+
+@app.route('/status/<system_id>/poll')
+def poll_system_status(system_id):
+    return poll_response(get_system(system_id))
+
+def stream_response(system):
+    """Server-Sent Events: one `status` event per change, resumable via Last-Event-ID."""
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', default=0, type=int)
+
+    def events(since):
+        while True:
+            version, status = system.wait_for_version(since, KEEPALIVE_SECONDS)
+            if version == since:
+                yield ": keepalive\n\n"
+                continue
+            since = version
+            yield f"id: {version}\nevent: status\ndata: {json.dumps(status)}\n\n"
+
+    return Response(events(since), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/status/stream')
+def stream_status():
+    return stream_response(get_system(DEFAULT_SYSTEM))
+
+@app.route('/status/<system_id>/stream')
+def stream_system_status(system_id):
+    return stream_response(get_system(system_id))
 
 @app.route('/history')
 def get_history():
-    return jsonify(history)
+    """
+    Paginated history, filtered server-side.
+    - ?cursor=<id>: newest-first page of rows older than the cursor
+    - ?since=<id>: oldest-first rows newer than the last id the client has seen
+    - ?reason=..., ?tx_hash=..., ?limit=... (max 1000)
+    """
+    limit = request.args.get('limit', default=DEFAULT_PAGE_SIZE, type=int)
+    reason = request.args.get('reason')
+    tx_hash = request.args.get('tx_hash')
+    since = request.args.get('since', type=int)
+
+    next_cursor = None
+    if tx_hash:
+        items = history.find_by_tx(tx_hash)
+    elif since is not None:
+        items = history.since(since, limit, reason)
+    else:
+        items, next_cursor = history.page(limit, request.args.get('cursor', type=int), reason)
+
+    return jsonify({"items": items, "next_cursor": next_cursor, "latest_id": history.latest_id()})
+
+@app.route('/history/reasons')
+def get_history_reasons():
+    return jsonify(history.reasons())
 
 @app.route('/add_history', methods=['POST'])
 def add_history():
-    global system_status  # Access the world state
-    data = request.json
-    history.append(data)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Body must be a JSON object")
+    system = write_system(data.get('system_id', DEFAULT_SYSTEM))
+    if history.add(data) is None:
+        # A re-sent report (the agent crashed before recording it): do not revert a newer problem
+        return jsonify({"status": "duplicate"})
     
-    # 🛠️ REVERT LOGIC: Once a payment is confirmed, the problem is fixed!
-    system_status["load"] = 45
-    system_status["sub_days"] = 15
+    # 🛠️ REVERT LOGIC: Once a payment is confirmed, the problem is fixed (for the system that paid)!
+    system.revert()
     
-    print(f"✅ Payment Received for: {data['reason']}. System health reverted to normal.")
+    print(f"✅ Payment Received for: {data.get('reason')}. {system.system_id} health reverted to normal.")
     return jsonify({"status": "success"})
 
 @app.route('/trigger/overload')
-def trigger_overload():
-    system_status["load"] = 95
+@app.route('/trigger/<system_id>/overload')
+def trigger_overload(system_id=DEFAULT_SYSTEM):
+    write_system(system_id).update({"load": 95})
     return "🚨 System Overload Triggered (95%)"
 
 @app.route('/trigger/sub')
-def trigger_sub():
-    system_status["sub_days"] = 1
+@app.route('/trigger/<system_id>/sub')
+def trigger_sub(system_id=DEFAULT_SYSTEM):
+    write_system(system_id).update({"sub_days": 1})
     return "🚨 Subscription Expiring Triggered"
 
 if __name__ == '__main__':
-    app.run(port=5001, debug=False)
\ No newline at end of file
+    try:
+        # Keep-alive connections on a fixed thread pool. Every open long-poll holds a thread,
+        # so STATUS_THREADS must stay above the number of agents watching at once.
+        from waitress import serve
+        print("🚀 Serving on http://127.0.0.1:5001 (waitress)")
+        serve(app, host='127.0.0.1', port=5001, threads=int(os.getenv("STATUS_THREADS", "256")), connection_limit=4096)
+    except ImportError:
+        app.run(port=5001, debug=False, threaded=True)
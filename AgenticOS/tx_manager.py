@@ -0,0 +1,336 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from web3.exceptions import TransactionNotFound
+from rpc_transport import batch_call
+
+# Node error fragments that mean our local nonce view no longer matches the chain
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "already known",
+    "replacement transaction underpriced",
+    "known transaction",
+)
+
+
+def is_nonce_error(error):
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+
+class NonceManager:
+    """
+    Hands out nonces for one account from a local counter so several
+    transactions can be in flight at once. Resyncs from the chain when a
+    reserved nonce is released out of order, when the node rejects a nonce,
+    or when an in-flight transaction gets replaced.
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next = None
+        self._in_flight = {}  # nonce -> tx hash
+
+    def sync(self):
+        """Reloads the next nonce from the node's pending view."""
+        chain_next = self.w3.eth.get_transaction_count(self.address, "pending")
+        mined = self.w3.eth.get_transaction_count(self.address, "latest")
+        with self._lock:
+            self._next = chain_next
+            for nonce in [n for n in self._in_flight if n < mined]:
+                del self._in_flight[nonce]
+        return chain_next
+
+    def seed(self, chain_next):
+        """Adopts a pending nonce fetched elsewhere (e.g. in a batched preflight) if not synced yet."""
+        with self._lock:
+            if self._next is None:
+                self._next = chain_next
+
+    def reserve(self):
+        with self._lock:
+            if self._next is not None:
+                nonce = self._next
+                self._next += 1
+                return nonce
+        self.sync()
+        return self.reserve()
+
+    def release(self, nonce):
+        """Gives back a nonce whose transaction was never broadcast."""
+        with self._lock:
+            self._in_flight.pop(nonce, None)
+            if self._next is not None and nonce == self._next - 1:
+                self._next = nonce
+            else:
+                # A gap would stall every later nonce; rebuild from the chain
+                self._next = None
+
+    def track(self, nonce, tx_hash):
+        with self._lock:
+            self._in_flight[nonce] = tx_hash
+
+    def confirm(self, nonce):
+        with self._lock:
+            self._in_flight.pop(nonce, None)
+
+    def invalidate(self):
+        """Forces the next reserve() to resync from the chain."""
+        with self._lock:
+            self._next = None
+
+    def in_flight(self):
+        with self._lock:
+            return dict(self._in_flight)
+
+
+# Settled transactions remembered for late wait() calls
+RESOLVED_HISTORY = 1024
+
+
+class PendingTx:
+    """A broadcast transaction waiting for confirmation, with every hash it was (re)sent under."""
+
+    def __init__(self, tx_hash, nonce, tx, block, nonce_manager=None):
+        self.hashes = [tx_hash]
+        self.nonce = nonce
+        self.nonce_manager = nonce_manager  # the sender's NonceManager, if the nonce is tracked
+        self.tx = tx  # unsigned tx dict, kept for fee-bumped rebroadcasts
+        self.future = Future()
+        self.sent_block = block
+        self.included = None  # (block number, block hash, receipt)
+        self.bumps = 0
+
+    @property
+    def tx_hash(self):
+        return self.hashes[-1]
+
+
+def _key(tx_hash):
+    if isinstance(tx_hash, str):
+        return bytes.fromhex(tx_hash.removeprefix("0x"))
+    return bytes(tx_hash)
+
+
+class ConfirmationService:
+    """
+    One background thread that follows new blocks for every pending
+    transaction, instead of one wait_for_transaction_receipt loop per tx.
+
+    Each new block is fetched once (tx hashes only) and matched against the
+    pending set; receipts are fetched only for our included transactions.
+    A transaction resolves once it is `confirmations` blocks deep, and
+    blocks that get reorganised away send their transactions back to
+    pending. A transaction whose nonce is consumed by something else (none
+    of its hashes has a receipt) is resolved as dropped (None). Register a
+    transaction with add() before broadcasting it, so the follower cannot
+    pass its block before it knows the hash. One still pending after `stuck_blocks`
+    blocks is handed to `rebroadcast(tx)`, which re-sends it with bumped
+    fees and returns (new hash, new tx), up to `max_bumps` times.
+    One service can follow several senders: add() takes the sender's
+    NonceManager, defaulting to the one given here.
+    """
+
+    def __init__(self, w3, nonce_manager=None, confirmations=1, poll_interval=1.0, stuck_blocks=3,
+                 max_bumps=3, on_receipt=None, rebroadcast=None):
+        self.w3 = w3
+        self.nonce_manager = nonce_manager
+        self.confirmations = max(1, confirmations)
+        self.poll_interval = poll_interval
+        self.stuck_blocks = stuck_blocks
+        self.max_bumps = max_bumps
+        self.on_receipt = on_receipt
+        self.rebroadcast = rebroadcast
+
+        self._pending = {}  # every hash of every pending tx -> PendingTx
+        self._block_hashes = {}  # recent block number -> hash, for reorg detection
+        self._last_block = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._resolved = OrderedDict()  # recently settled hash -> receipt (None = dropped)
+
+    def add(self, tx_hash, nonce=None, tx=None, nonce_manager=None):
+        """
+        Starts tracking a tx; returns a Future for its receipt (None if dropped).
+        Call it before the broadcast (the hash is keccak(raw_tx)) and discard()
+        the tx if the broadcast fails.
+        """
+        with self._cond:
+            if self._last_block is None:
+                self._last_block = self.w3.eth.block_number - 1
+            entry = PendingTx(_key(tx_hash), nonce, tx, self._last_block + 1, nonce_manager or self.nonce_manager)
+            self._pending[entry.tx_hash] = entry
+            self._cond.notify_all()
+        self._ensure_running()
+        return entry.future
+
+    def discard(self, tx_hash):
+        """Stops tracking a tx that was never broadcast; its Future is cancelled."""
+        key = _key(tx_hash)
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                return
+            for pending_hash in entry.hashes:
+                self._pending.pop(pending_hash, None)
+        entry.future.cancel()
+
+    def wait(self, tx_hash, timeout=120):
+        """Blocks until tx_hash is confirmed (or dropped); returns the receipt or None."""
+        key = _key(tx_hash)
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                return self._resolved.get(key)
+        try:
+            return entry.future.result(timeout)
+        except FutureTimeout:
+            return None
+
+    def pending(self):
+        with self._cond:
+            return list({id(entry): entry.tx_hash for entry in self._pending.values()}.values())
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="confirmations", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Confirmation Service Error: {e}", flush=True)
+            with self._cond:
+                # New txs wake the loop early; otherwise check once per poll_interval
+                self._cond.wait(self.poll_interval)
+
+    def poll(self):
+        """Processes every block since the last call. One eth_blockNumber call when nothing is new."""
+        head = self.w3.eth.block_number
+        with self._cond:
+            number = self._last_block + 1 if self._last_block is not None else head
+        while number <= head:
+            block = self.w3.eth.get_block(number)
+            parent = self._block_hashes.get(number - 1)
+            if parent is not None and bytes(block["parentHash"]) != parent:
+                number = self._rewind(number - 1)
+                continue
+            self._process_block(block)
+            number += 1
+        self._settle(head)
+
+    def _rewind(self, number):
+        """Reorg: walks back to the last block we saw that is still canonical; returns the next block to process."""
+        while number in self._block_hashes and bytes(self.w3.eth.get_block(number)["hash"]) != self._block_hashes[number]:
+            number -= 1
+        fork = number
+        print(f"⚠️ Reorg detected; re-checking transactions after block {fork}.", flush=True)
+        with self._cond:
+            for stale in [n for n in self._block_hashes if n > fork]:
+                del self._block_hashes[stale]
+            for entry in set(self._pending.values()):
+                if entry.included is not None and entry.included[0] > fork:
+                    entry.included = None
+            self._last_block = fork
+        return fork + 1
+
+    def _process_block(self, block):
+        number = block["number"]
+        with self._cond:
+            ours = [_key(h) for h in block["transactions"] if _key(h) in self._pending]
+        receipts = batch_call(self.w3, [
+            (lambda h=h: self.w3.eth.get_transaction_receipt(h)) for h in ours
+        ]) if ours else []
+        with self._cond:
+            for tx_hash, receipt in zip(ours, receipts):
+                entry = self._pending.get(tx_hash)
+                if entry is not None:
+                    entry.included = (number, bytes(block["hash"]), receipt)
+            self._block_hashes[number] = bytes(block["hash"])
+            for old in [n for n in self._block_hashes if n <= number - self.confirmations - 64]:
+                del self._block_hashes[old]
+            self._last_block = number
+
+    def _settle(self, head):
+        """Resolves confirmed txs, detects replaced/dropped ones and rebroadcasts stuck ones."""
+        with self._cond:
+            entries = list({id(entry): entry for entry in self._pending.values()}.values())
+
+        mined_nonces = {}  # sender -> nonce count at head
+        for entry in entries:
+            if entry.included is not None:
+                if head - entry.included[0] + 1 >= self.confirmations:
+                    self._resolve(entry, entry.included[2])
+                continue
+
+            nonce_manager = entry.nonce_manager
+            if entry.nonce is not None and nonce_manager is not None:
+                if nonce_manager.address not in mined_nonces:
+                    # Nonce count as of the head we just processed, so it agrees with the blocks we matched
+                    mined_nonces[nonce_manager.address] = self.w3.eth.get_transaction_count(nonce_manager.address, head)
+                if entry.nonce < mined_nonces[nonce_manager.address]:
+                    receipt = self._find_receipt(entry.hashes)
+                    if receipt is not None:
+                        # Mined in a block we matched before we knew this hash (or under an older bump)
+                        entry.included = (receipt["blockNumber"], bytes(receipt["blockHash"]), receipt)
+                        if head - receipt["blockNumber"] + 1 >= self.confirmations:
+                            self._resolve(entry, receipt)
+                        continue
+                    # Our nonce was consumed by a different transaction
+                    print(f"⚠️ Transaction {entry.tx_hash.hex()} was replaced or dropped.", flush=True)
+                    nonce_manager.invalidate()
+                    self._resolve(entry, None)
+                    continue
+
+            if (self.rebroadcast is not None and entry.tx is not None and entry.bumps < self.max_bumps
+                    and head - entry.sent_block >= self.stuck_blocks):
+                self._bump(entry, head)
+
+    def _find_receipt(self, tx_hashes):
+        for tx_hash in reversed(tx_hashes):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _bump(self, entry, head):
+        try:
+            new_hash, new_tx = self.rebroadcast(entry.tx)
+        except Exception as e:
+            print(f"⚠️ Rebroadcast of {entry.tx_hash.hex()} failed: {e}", flush=True)
+            entry.sent_block = head  # try again after another stuck_blocks
+            return
+        with self._cond:
+            entry.hashes.append(_key(new_hash))
+            entry.tx = new_tx
+            entry.bumps += 1
+            entry.sent_block = head
+            self._pending[entry.tx_hash] = entry
+        if entry.nonce_manager is not None and entry.nonce is not None:
+            entry.nonce_manager.track(entry.nonce, new_hash)
+        print(f"⛽ Rebroadcast with higher fees: {entry.hashes[-2].hex()} -> {entry.tx_hash.hex()}", flush=True)
+
+    def _resolve(self, entry, receipt):
+        with self._cond:
+            for tx_hash in entry.hashes:
+                self._pending.pop(tx_hash, None)
+                self._resolved[tx_hash] = receipt
+            while len(self._resolved) > RESOLVED_HISTORY:
+                self._resolved.popitem(last=False)
+        if entry.nonce_manager is not None and entry.nonce is not None:
+            entry.nonce_manager.confirm(entry.nonce)
+        if receipt is not None and self.on_receipt:
+            self.on_receipt(receipt["transactionHash"], receipt)
+        try:
+            entry.future.set_result(receipt)
+        except InvalidStateError:
+            pass  # discarded while this poll was settling it
@@ -14,6 +14,7 @@ contract AgenticCommerceOS_Master {
     error CooldownActive(uint256 nextAllowedTimestamp);
     error DailyBudgetExceeded(uint256 remainingBudget);
     error TransferFailed();
+    error EmptyBatch();
 
     address public immutable owner;
     bool public isPaused;
@@ -28,6 +29,24 @@ contract AgenticCommerceOS_Master {
         bool isActive;
     }
 
+    struct PurchaseItem {
+        address payable merchant;
+        uint256 amount;
+        string purpose;
+    }
+
+    struct AgentConfig {
+        address agent;
+        string name;
+        uint256 dailyLimit;
+        uint256 cooldown;
+    }
+
+    struct MerchantConfig {
+        address merchant;
+        string label;
+    }
+
     mapping(address => AgentPolicy) public agents;
     mapping(address => bool) public whitelistedMerchants;
 
@@ -61,16 +80,15 @@ contract AgenticCommerceOS_Master {
     // --- Governance Actions (Human Owner) ---
 
     function configureAgent(address _agent, string calldata _name, uint256 _dailyLimit, uint256 _cooldown) external onlyOwner {
-        agents[_agent] = AgentPolicy({
-            agentName: _name,
-            dailyLimit: _dailyLimit,
-            totalSpentToday: 0,
-            lastResetTime: block.timestamp,
-            cooldownPeriod: _cooldown,
-            lastTxTimestamp: 0,
-            isActive: true
-        });
-        emit AgentConfigured(_agent, _name, _dailyLimit);
+        _configureAgent(_agent, _name, _dailyLimit, _cooldown);
+    }
+
+    /// @notice Bulk version of configureAgent for fleet provisioning; one event per agent.
+    function configureAgents(AgentConfig[] calldata _configs) external onlyOwner {
+        for (uint256 i = 0; i < _configs.length; i++) {
+            AgentConfig calldata config = _configs[i];
+            _configureAgent(config.agent, config.name, config.dailyLimit, config.cooldown);
+        }
     }
 
     function addMerchant(address _merchant, string calldata _label) external onlyOwner {
@@ -78,12 +96,33 @@ contract AgenticCommerceOS_Master {
         emit MerchantAuthorized(_merchant, _label);
     }
 
+    /// @notice Bulk version of addMerchant; one event per merchant.
+    function addMerchants(MerchantConfig[] calldata _merchants) external onlyOwner {
+        for (uint256 i = 0; i < _merchants.length; i++) {
+            whitelistedMerchants[_merchants[i].merchant] = true;
+            emit MerchantAuthorized(_merchants[i].merchant, _merchants[i].label);
+        }
+    }
+
     function togglePause() external onlyOwner {
         isPaused = !isPaused;
         string memory statusMsg = isPaused ? "System Paused" : "System Active";
         emit SystemStatus(statusMsg, isPaused);
     }
 
+    function _configureAgent(address _agent, string calldata _name, uint256 _dailyLimit, uint256 _cooldown) private {
+        agents[_agent] = AgentPolicy({
+            agentName: _name,
+            dailyLimit: _dailyLimit,
+            totalSpentToday: 0,
+            lastResetTime: block.timestamp,
+            cooldownPeriod: _cooldown,
+            lastTxTimestamp: 0,
+            isActive: true
+        });
+        emit AgentConfigured(_agent, _name, _dailyLimit);
+    }
+
     // --- AI Agent Actions ---
 
     function executePurchase(address payable _merchant, uint256 _amount, string calldata _purpose) external nonReentrant {
@@ -92,6 +131,43 @@ contract AgenticCommerceOS_Master {
 
         if (!policy.isActive) revert AgentDisabled();
         if (!whitelistedMerchants[_merchant]) revert MerchantNotWhitelisted();
+        _chargePolicy(policy, _amount);
+
+        (bool success, ) = _merchant.call{value: _amount}("");
+        if (!success) revert TransferFailed();
+
+        emit PurchaseReceipt(msg.sender, _merchant, _amount, _purpose);
+    }
+
+    /**
+     * @notice Runs several purchases under one reentrancy guard and one policy/budget check.
+     * @dev The whole batch reverts if any item fails; one PurchaseReceipt is emitted per item.
+     */
+    function batchExecutePurchase(PurchaseItem[] calldata _items) external nonReentrant {
+        if (isPaused) revert SystemPaused();
+        if (_items.length == 0) revert EmptyBatch();
+        AgentPolicy storage policy = agents[msg.sender];
+
+        if (!policy.isActive) revert AgentDisabled();
+
+        uint256 total;
+        for (uint256 i = 0; i < _items.length; i++) {
+            if (!whitelistedMerchants[_items[i].merchant]) revert MerchantNotWhitelisted();
+            total += _items[i].amount;
+        }
+        _chargePolicy(policy, total);
+
+        for (uint256 i = 0; i < _items.length; i++) {
+            PurchaseItem calldata item = _items[i];
+            (bool success, ) = item.merchant.call{value: item.amount}("");
+            if (!success) revert TransferFailed();
+
+            emit PurchaseReceipt(msg.sender, item.merchant, item.amount, item.purpose);
+        }
+    }
+
+    /// @dev Balance, cooldown and daily budget checks shared by the single and batch paths.
+    function _chargePolicy(AgentPolicy storage policy, uint256 _amount) private {
         if (address(this).balance < _amount) revert InsufficientContractBalance(address(this).balance, _amount);
         if (block.timestamp < policy.lastTxTimestamp + policy.cooldownPeriod) revert CooldownActive(policy.lastTxTimestamp + policy.cooldownPeriod);
 
@@ -105,11 +181,6 @@ contract AgenticCommerceOS_Master {
 
         policy.totalSpentToday += _amount;
         policy.lastTxTimestamp = block.timestamp;
-
-        (bool success, ) = _merchant.call{value: _amount}("");
-        if (!success) revert TransferFailed();
-
-        emit PurchaseReceipt(msg.sender, _merchant, _amount, _purpose);
     }
 
     function getAgentInfo(address _agent) external view returns (string memory name, uint256 remainingBudget, uint256 nextAllowedTxTime, bool active) {